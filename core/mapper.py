@@ -7,15 +7,173 @@ import folium
 from folium import plugins
 import json
 import sqlite3
-from datetime import datetime, timedelta
+import hashlib
+import shutil
+from datetime import datetime
 import pandas as pd
 import numpy as np
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    from core.schema import DETECTION_INDEXES, lookback_cutoff
+except ImportError:  # run directly as core/mapper.py
+    from schema import DETECTION_INDEXES, lookback_cutoff
+
+def _safe_json(text):
+    """Parse a bluetooth_devices JSON blob, treating bad data as no devices"""
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return []
+
+# Selectable detection columns -> SQL expression (doubles as the whitelist)
+_DETECTION_COLUMNS = {
+    'id': 'd.id',
+    'timestamp': 'd.timestamp',
+    'station_name': 'd.station_name',
+    'station_address': 'd.station_address',
+    'gps_coords': 'd.gps_coords',
+    'latitude': 'd.lat AS latitude',
+    'longitude': 'd.lon AS longitude',
+    'threat_level': 'd.threat_level',
+    'bluetooth_devices': 'd.bluetooth_devices',
+    'notes': 'd.notes',
+    'station_detections': 'COALESCE(s.total_detections, 0) AS station_detections',
+}
+
+# Enough for the heatmap, timeline, printable map and summaries; only the
+# cluster map's rich popups need the full set
+_LEAN_COLUMNS = ['timestamp', 'station_name', 'latitude', 'longitude', 'threat_level']
+
+# Above this many detections the cluster map hands raw rows to
+# FastMarkerCluster and lets the browser build markers/popups
+_FAST_MARKER_MIN = 50
+
+# Above this many points heat layers are binned into ~1/256 degree cells
+# (roughly zoom 12) so the HTML carries one point per cell, not per detection
+_HEAT_AGGREGATE_MIN = 500
+_HEAT_CELLS_PER_DEGREE = 256
+
+# Row layout: [lat, lon, threat, color, icon, station, address, time]
+_FAST_MARKER_CB = """
+function (row) {
+    var icon = L.AwesomeMarkers.icon({icon: row[4], prefix: 'fa', markerColor: row[3]});
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindTooltip(row[5] + ' - Threat: ' + row[2] + '/10');
+    marker.bindPopup('<b>' + row[5] + '</b><br>' + row[6] +
+                     '<br>Time: ' + row[7] + '<br>Threat: ' + row[2] + '/10');
+    return marker;
+}
+"""
+
+# Static HTML scaffolding, built once at import; only the variable bits are
+# interpolated per popup/map
+_POPUP_TMPL = """
+        <div style="font-family: Arial, sans-serif; max-width: 320px;">
+            <div style="background-color: {threat_color}; color: white; padding: 8px; border-radius: 5px 5px 0 0;">
+                <h3 style="margin: 0; font-size: 16px;">{station}</h3>
+            </div>
+            <div style="padding: 10px;">
+                <p><b>📍 Address:</b><br>{address}</p>
+                <p><b>🕐 Time:</b> {timestamp}</p>
+                <p><b>⚠️ Threat Level:</b> <span style="color: {threat_color}; font-weight: bold;">
+                    {threat_level}/10</span></p>
+                <hr style="margin: 10px 0;">
+                <p><b>📱 Detected Devices:</b><br>{device_html}</p>
+                <hr style="margin: 10px 0;">
+                <p style="font-size: 11px; color: #666;">
+                ID: {detection_id}<br>
+                Notes: {notes}
+                </p>
+            </div>
+        </div>
+        """
+
+# The title's "Generated:" stamp, re-stamped when a cached render is reused
+_GENERATED_RE = re.compile(r'Generated: \d{4}-\d{2}-\d{2} \d{2}:\d{2} \|')
+
+_TITLE_TMPL = '''
+        <div style="position: fixed; top: 10px; left: 50px; right: 50px; 
+                    background: rgba(255,255,255,0.9); padding: 10px 20px;
+                    border-radius: 5px; border: 2px solid #d9534f;
+                    z-index: 9999; text-align: center; font-family: Arial;">
+            <h2 style="margin: 5px 0; color: #d9534f;">{title}</h2>
+            <p style="margin: 0; font-size: 12px;">
+            Generated: {generated} | 
+            Community Sentinel Initiative
+            </p>
+        </div>
+        '''
+
+_LEGEND_TMPL = '''
+        <div style="position: fixed; bottom: 50px; left: 20px; width: 220px;
+                    background: rgba(255,255,255,0.9); padding: 10px;
+                    border-radius: 5px; border: 2px solid #666;
+                    z-index: 9999; font-family: Arial; font-size: 12px;">
+            <h4 style="margin-top: 0; color: #333;">THREAT LEGEND</h4>
+            <div style="display: grid; grid-template-columns: 20px auto; gap: 5px; margin-bottom: 10px;">
+                <div style="background: green; border-radius: 3px;"></div><div>0-2: Low</div>
+                <div style="background: yellow; border-radius: 3px;"></div><div>3-4: Medium</div>
+                <div style="background: orange; border-radius: 3px;"></div><div>5-6: High</div>
+                <div style="background: red; border-radius: 3px;"></div><div>7-8: Severe</div>
+                <div style="background: black; border-radius: 3px;"></div><div>9-10: Critical</div>
+            </div>
+            <hr style="margin: 10px 0;">
+            <p style="margin: 5px 0;">
+                <b>Total Detections:</b> {detection_count}<br>
+                <b>Map Controls:</b><br>
+                • Click markers for details<br>
+                • Use layers button to toggle heatmap<br>
+                • Zoom with mouse wheel
+            </p>
+        </div>
+        '''
+
+_HEATMAP_LEGEND_TMPL = '''
+        <div style="position: fixed; bottom: 50px; left: 20px; width: 250px;
+                    background: rgba(0,0,0,0.7); color: white; padding: 10px;
+                    border-radius: 5px; border: 2px solid #ff6b6b;
+                    z-index: 9999; font-family: Arial; font-size: 12px;">
+            <h4 style="margin-top: 0; color: #ff6b6b;">THREAT HEATMAP</h4>
+            <div style="background: linear-gradient(to right, 
+                    blue, cyan, lime, yellow, orange, red);
+                    height: 20px; width: 100%; margin: 5px 0; border-radius: 3px;"></div>
+            <div style="display: flex; justify-content: space-between; font-size: 10px;">
+                <span>Low Threat</span><span>High Threat</span>
+            </div>
+            <hr style="margin: 10px 0; border-color: #555;">
+            <p style="margin: 5px 0; font-size: 11px;">
+                <b>🔴 Hotspots</b> = High skimmer activity<br>
+                <b>🟡 Warm areas</b> = Moderate activity<br>
+                <b>🟢 Cool areas</b> = Low/no activity<br><br>
+                <b>Total scans:</b> {detection_count}<br>
+                <b>Perfect for police patrol planning</b>
+            </p>
+        </div>
+        '''
+
+@lru_cache(maxsize=1024)
+def _device_list_html(devices_tuple, device_total):
+    """Popup device list; the same handful of modules recurs across detections"""
+    if not devices_tuple:
+        return "No Bluetooth devices recorded"
+    device_html = "<br>".join(
+        f"• {name} (Threat: {dev_threat}/10, RSSI: {rssi})"
+        for name, dev_threat, rssi in devices_tuple
+    )
+    if device_total > 5:
+        device_html += f"<br>• ... and {device_total - 5} more"
+    return device_html
+
 class ThreatMapper:
-    def __init__(self, db_path='data/detections.db'):
+    def __init__(self, db_path='data/detections.db', days_back=30):
         self.db_path = db_path
+        self.days_back = days_back  # Lookback window for generated maps
         
         # Threat color scheme - police ready
         self.threat_colors = {
@@ -31,54 +189,240 @@ class ThreatMapper:
             9: 'black',      # Critical
             10: 'black'      # Emergency
         }
+        
+        # Same scheme as an array indexed by clipped threat level
+        self._color_arr = np.array([self.threat_colors[i] for i in range(11)], dtype=object)
+        
+        self._schema_ready = False
+        self._has_rtree = False
+        
+        # One long-lived connection, opened on first use
+        self._conn = None
+        self._conn_lock = threading.Lock()
+    
+    def _open_conn(self):
+        """Return the shared connection, opening and tuning it on first use"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.executescript('''
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-20000;
+                PRAGMA mmap_size=268435456;
+                PRAGMA busy_timeout=5000;
+            ''')
+            self._conn = conn
+        return self._conn
     
-    def get_detection_data(self, days_back=30):
-        """Get detection data from database - smart and efficient"""
-        conn = sqlite3.connect(self.db_path)
+    def close(self):
+        """Close the shared database connection"""
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def _ensure_schema(self, conn):
+        """Add the derived columns and indexes the map queries rely on (once per mapper)"""
+        if self._schema_ready:
+            return
         
-        # Smart query that gets everything we need
-        query = '''
+        try:
+            columns = {row[1] for row in conn.execute('PRAGMA table_xinfo(detections)')}
+            
+            # lat/lon are parsed out of gps_coords ("lat,lon") by SQLite itself;
+            # placeholders like GPS_PENDING have no digits/comma and stay NULL
+            if 'lat' not in columns:
+                conn.execute('''
+                    ALTER TABLE detections ADD COLUMN lat REAL GENERATED ALWAYS AS (
+                        CASE WHEN gps_coords GLOB '*[0-9]*,*[0-9]*'
+                        THEN CAST(substr(gps_coords, 1, instr(gps_coords, ',') - 1) AS REAL) END
+                    ) VIRTUAL
+                ''')
+            if 'lon' not in columns:
+                conn.execute('''
+                    ALTER TABLE detections ADD COLUMN lon REAL GENERATED ALWAYS AS (
+                        CASE WHEN gps_coords GLOB '*[0-9]*,*[0-9]*'
+                        THEN CAST(substr(gps_coords, instr(gps_coords, ',') + 1) AS REAL) END
+                    ) VIRTUAL
+                ''')
+            
+            conn.executescript(DETECTION_INDEXES)
+            conn.executescript('''
+                CREATE INDEX IF NOT EXISTS idx_detections_latlon ON detections(lat, lon);
+                CREATE INDEX IF NOT EXISTS idx_stations_name ON stations(name);
+            ''')
+            self._schema_ready = True
+        except sqlite3.OperationalError as e:
+            # Tables not created yet - Sentinel.setup_database runs later
+            print(f"[!] Could not prepare map schema: {e}")
+            return
+        
+        self._ensure_spatial_index(conn)
+    
+    def _ensure_spatial_index(self, conn):
+        """R*Tree over detection coordinates, kept in sync by triggers"""
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'detections_rtree'"
+            ).fetchone()
+            
+            # detections.id is TEXT, so the R*Tree is keyed by rowid
+            conn.executescript('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS detections_rtree
+                    USING rtree(id, minLat, maxLat, minLon, maxLon);
+                
+                CREATE TRIGGER IF NOT EXISTS detections_rtree_insert
+                AFTER INSERT ON detections
+                WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL
+                BEGIN
+                    INSERT OR REPLACE INTO detections_rtree
+                    VALUES (NEW.rowid, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS detections_rtree_update
+                AFTER UPDATE OF gps_coords ON detections
+                BEGIN
+                    DELETE FROM detections_rtree WHERE id = OLD.rowid;
+                    INSERT INTO detections_rtree
+                    SELECT NEW.rowid, NEW.lat, NEW.lat, NEW.lon, NEW.lon
+                    WHERE NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS detections_rtree_delete
+                AFTER DELETE ON detections
+                BEGIN
+                    DELETE FROM detections_rtree WHERE id = OLD.rowid;
+                END;
+            ''')
+            
+            if not exists:
+                # Backfill detections recorded before the index existed
+                with conn:
+                    conn.execute('''
+                        INSERT INTO detections_rtree
+                        SELECT rowid, lat, lat, lon, lon FROM detections
+                        WHERE lat IS NOT NULL AND lon IS NOT NULL
+                    ''')
+            
+            self._has_rtree = True
+        except sqlite3.OperationalError as e:
+            # SQLite built without the R*Tree module
+            print(f"[!] Spatial index unavailable: {e}")
+    
+    def _threat_styles(self, threat):
+        """Clipped threat levels and marker colors for a whole threat_level column"""
+        lvl = np.clip(threat.fillna(0).to_numpy(dtype=np.int64), 0, 10)
+        return lvl, self._color_arr[lvl]
+    
+    def _heat_points(self, rows):
+        """[lat, lon, weight] rows for a heat layer, grid-aggregated when large"""
+        arr = np.asarray(rows, dtype=np.float64).reshape(-1, 3)
+        if len(arr) <= _HEAT_AGGREGATE_MIN:
+            return arr.tolist()
+        
+        cells = np.floor(arr[:, :2] * _HEAT_CELLS_PER_DEGREE).astype(np.int64)
+        _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        
+        lat = np.bincount(inverse, weights=arr[:, 0]) / counts
+        lon = np.bincount(inverse, weights=arr[:, 1]) / counts
+        threat = np.bincount(inverse, weights=arr[:, 2])
+        return np.column_stack((lat, lon, threat)).tolist()
+    
+    def get_detection_data(self, days_back=30, columns=None):
+        """
+        Get detection data from database - smart and efficient
+        columns: names from _DETECTION_COLUMNS to select (default: all)
+        """
+        if columns is None:
+            columns = list(_DETECTION_COLUMNS)
+        
+        # Only whitelisted names ever reach the SQL text
+        unknown = [c for c in columns if c not in _DETECTION_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown detection column(s): {', '.join(unknown)}")
+        
+        select_list = ',\n                '.join(_DETECTION_COLUMNS[c] for c in columns)
+        join = ''
+        if 'station_detections' in columns:
+            join = 'LEFT JOIN stations s ON d.station_name = s.name'
+        
+        query = f'''
             SELECT 
-                d.id,
-                d.timestamp,
-                d.station_name,
-                d.station_address,
-                d.gps_coords,
-                d.threat_level,
-                d.bluetooth_devices,
-                d.notes,
-                COALESCE(s.total_detections, 0) as station_detections
+                {select_list}
             FROM detections d
-            LEFT JOIN stations s ON d.station_name = s.name
-            WHERE date(d.timestamp) >= date('now', ?)
+            {join}
+            WHERE d.timestamp >= ?
             ORDER BY d.timestamp DESC
         '''
         
-        df = pd.read_sql_query(query, conn, params=(f'-{days_back} days',))
-        conn.close()
-        
-        # Parse GPS coordinates if available
-        if not df.empty:
-            df['latitude'] = df['gps_coords'].apply(self._extract_coord, coord_type='lat')
-            df['longitude'] = df['gps_coords'].apply(self._extract_coord, coord_type='lon')
+        with self._conn_lock:
+            conn = self._open_conn()
+            self._ensure_schema(conn)
+            return pd.read_sql_query(query, conn, params=(lookback_cutoff(days_back),))
+    
+    def get_detections_in_bbox(self, min_lat, max_lat, min_lon, max_lon, days_back=30):
+        """Detections inside a lat/lon bounding box (e.g. the visible viewport)"""
+        with self._conn_lock:
+            conn = self._open_conn()
+            self._ensure_schema(conn)
+            
+            if self._has_rtree:
+                query = '''
+                    SELECT d.id, d.timestamp, d.station_name, d.station_address,
+                           d.lat AS latitude, d.lon AS longitude, d.threat_level
+                    FROM detections_rtree r
+                    JOIN detections d ON d.rowid = r.id
+                    WHERE r.maxLat >= ? AND r.minLat <= ?
+                      AND r.maxLon >= ? AND r.minLon <= ?
+                      AND d.timestamp >= ?
+                '''
+            else:
+                query = '''
+                    SELECT d.id, d.timestamp, d.station_name, d.station_address,
+                           d.lat AS latitude, d.lon AS longitude, d.threat_level
+                    FROM detections d
+                    WHERE d.lat >= ? AND d.lat <= ?
+                      AND d.lon >= ? AND d.lon <= ?
+                      AND d.timestamp >= ?
+                '''
+            
+            return pd.read_sql_query(
+                query, conn,
+                params=(min_lat, max_lat, min_lon, max_lon, lookback_cutoff(days_back))
+            )
+    
+    def get_heat_points(self, days_back=30):
+        """(lat, lon, threat_level) tuples straight from SQLite - no DataFrame"""
+        query = '''
+            SELECT lat, lon, COALESCE(threat_level, 0)
+            FROM detections
+            WHERE lat IS NOT NULL AND lon IS NOT NULL AND timestamp >= ?
+        '''
         
-        return df
+        with self._conn_lock:
+            conn = self._open_conn()
+            self._ensure_schema(conn)
+            return conn.execute(query, (lookback_cutoff(days_back),)).fetchall()
     
-    def _extract_coord(self, coord_str, coord_type='lat'):
-        """Smart coordinate extraction"""
-        if not coord_str or coord_str in ['GPS_COORDS_HERE', 'GPS_PENDING', 'UNKNOWN']:
-            return None
+    def get_station_rollup(self, days_back=30):
+        """Per-station summary (one row per station) computed by SQLite"""
+        query = '''
+            SELECT 
+                station_name,
+                MAX(threat_level) AS threat_level,
+                MIN(station_address) AS station_address,
+                COUNT(*) AS detection_count
+            FROM detections
+            WHERE timestamp >= ?
+            GROUP BY station_name
+        '''
         
-        try:
-            if ',' in coord_str:
-                parts = coord_str.split(',')
-                if len(parts) >= 2:
-                    lat = float(parts[0].strip())
-                    lon = float(parts[1].strip())
-                    return lat if coord_type == 'lat' else lon
-            return None
-        except:
-            return None
+        with self._conn_lock:
+            conn = self._open_conn()
+            self._ensure_schema(conn)
+            return pd.read_sql_query(query, conn, params=(lookback_cutoff(days_back),))
     
     def generate_map(self, stations=None):
         """
@@ -90,7 +434,8 @@ class ThreatMapper:
         print("="*70)
         
         # Get data
-        data_df = self.get_detection_data(days_back=30)
+        days_back = self.days_back
+        data_df = self.get_detection_data(days_back=days_back, columns=_LEAN_COLUMNS)
         
         if data_df.empty:
             print("[!] No detection data found in database")
@@ -109,31 +454,57 @@ class ThreatMapper:
         choice = input("\n[?] Choice (1-3, default 3): ").strip()
         
         if choice == "1":
-            map_obj = self._generate_cluster_map(data_df)
+            generator = self._generate_cluster_map
             map_type = "interactive"
         elif choice == "2":
-            map_obj = self._generate_heatmap(data_df)
+            generator = self._generate_heatmap
             map_type = "heatmap"
         else:
             # Auto-select based on data
             if len(data_df) > 20:
-                map_obj = self._generate_heatmap(data_df)
+                generator = self._generate_heatmap
                 map_type = "heatmap"
             else:
-                map_obj = self._generate_cluster_map(data_df)
+                generator = self._generate_cluster_map
                 map_type = "cluster"
         
-        if not map_obj:
-            print("[!] Failed to generate map")
-            return "Map generation failed"
-        
-        # Save the map
         exports_dir = Path('exports')
-        exports_dir.mkdir(exist_ok=True)
+        cache_dir = exports_dir / '.cache'
+        cache_dir.mkdir(parents=True, exist_ok=True)
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M')
+        now = datetime.now()
+        timestamp = now.strftime('%Y%m%d_%H%M')
         map_file = exports_dir / f"skimmer_map_{timestamp}.html"
-        map_obj.save(str(map_file))
+        
+        # Same window, same newest detection, same row count, same map type
+        # means the same map - reuse the last render instead of rebuilding it.
+        # Only the latest render per map type is kept.
+        cache_key = hashlib.blake2b(
+            f"{days_back}|{data_df['timestamp'].max()}|{len(data_df)}|{map_type}".encode()
+        ).hexdigest()[:16]
+        cache_file = cache_dir / f"{map_type}.html"
+        key_file = cache_dir / f"{map_type}.key"
+        
+        cached = cache_file.exists() and key_file.exists() and key_file.read_text() == cache_key
+        if cached:
+            print("\n[*] No new detections since last render - reusing cached map")
+            html = _GENERATED_RE.sub(f"Generated: {now:%Y-%m-%d %H:%M} |", cache_file.read_text(encoding='utf-8'))
+            map_file.write_text(html, encoding='utf-8')
+        else:
+            if generator == self._generate_cluster_map:
+                # Popups need address, notes and device lists as well
+                map_obj = generator(self.get_detection_data(days_back=days_back))
+            else:
+                map_obj = generator(data_df)
+            
+            if not map_obj:
+                print("[!] Failed to generate map")
+                return "Map generation failed"
+            
+            # Save the map
+            map_obj.save(str(map_file))
+            shutil.copyfile(map_file, cache_file)
+            key_file.write_text(cache_key)
         
         print(f"\n[✓] MAP GENERATED SUCCESSFULLY!")
         print(f"    File: {map_file}")
@@ -170,47 +541,36 @@ class ThreatMapper:
             control_scale=True
         )
         
-        # Add marker cluster
-        marker_cluster = plugins.MarkerCluster(
-            name="Skimmer Detections",
-            options={'maxClusterRadius': 40}
-        ).add_to(threat_map)
-        
-        # Add individual markers
-        detection_count = 0
-        for _, row in data_df.dropna(subset=['latitude', 'longitude']).iterrows():
-            detection_count += 1
-            
-            # Parse Bluetooth devices
-            devices = []
-            if row['bluetooth_devices']:
-                try:
-                    devices = json.loads(row['bluetooth_devices'])
-                except:
-                    devices = []
-            
-            # Create detailed popup
-            popup_html = self._create_popup_html(row, devices)
+        # Add individual markers - pull each column out once, then zip
+        valid = data_df.dropna(subset=['latitude', 'longitude'])
+        detection_count = len(valid)
+        
+        # Threat styling for every marker in one vectorized pass
+        lvl, colors = self._threat_styles(valid['threat_level'])
+        icons = np.where(lvl >= 5, 'exclamation-triangle', 'info-circle')
+        
+        if detection_count >= _FAST_MARKER_MIN:
+            # Large datasets: ship compact rows, markers are built client-side
+            rows = [list(r) for r in zip(
+                valid['latitude'].tolist(), valid['longitude'].tolist(),
+                lvl.tolist(), colors.tolist(), icons.tolist(),
+                valid['station_name'].tolist(), valid['station_address'].tolist(),
+                valid['timestamp'].str[:19].tolist())]
             
-            # Determine icon based on threat level
-            threat_level = min(int(row['threat_level']), 10)
-            icon_color = self.threat_colors.get(threat_level, 'gray')
-            
-            folium.Marker(
-                location=[row['latitude'], row['longitude']],
-                popup=folium.Popup(popup_html, max_width=350),
-                icon=folium.Icon(
-                    color=icon_color,
-                    icon='exclamation-triangle' if threat_level >= 5 else 'info-circle',
-                    prefix='fa'
-                ),
-                tooltip=f"{row['station_name']} - Threat: {threat_level}/10"
-            ).add_to(marker_cluster)
+            plugins.FastMarkerCluster(
+                data=rows,
+                callback=_FAST_MARKER_CB,
+                name="Skimmer Detections",
+                options={'maxClusterRadius': 40}
+            ).add_to(threat_map)
+        else:
+            self._add_detailed_markers(threat_map, valid, lvl, colors, icons)
         
         # Add heatmap as optional overlay if we have enough points
         if detection_count >= 5:
-            heat_data = [[row['latitude'], row['longitude'], row['threat_level']] 
-                        for _, row in data_df.dropna(subset=['latitude', 'longitude']).iterrows()]
+            heat_data = self._heat_points(
+                valid[['latitude', 'longitude', 'threat_level']].to_numpy()
+            )
             
             plugins.HeatMap(
                 heat_data,
@@ -231,18 +591,50 @@ class ThreatMapper:
         
         return threat_map
     
+    def _add_detailed_markers(self, threat_map, valid, lvl, colors, icons):
+        """Add full-detail markers (rich popups) for small datasets"""
+        marker_cluster = plugins.MarkerCluster(
+            name="Skimmer Detections",
+            options={'maxClusterRadius': 40}
+        ).add_to(threat_map)
+        
+        # Parse Bluetooth devices for the whole column up front
+        device_lists = [_safe_json(s) if s else [] for s in valid['bluetooth_devices'].tolist()]
+        
+        for lat, lon, station, address, ts, threat_level, icon_color, icon, det_id, notes, devices in zip(
+                valid['latitude'].tolist(), valid['longitude'].tolist(),
+                valid['station_name'].tolist(), valid['station_address'].tolist(),
+                valid['timestamp'].tolist(), lvl.tolist(), colors.tolist(), icons.tolist(),
+                valid['id'].tolist(), valid['notes'].tolist(),
+                device_lists):
+            
+            # Create detailed popup
+            popup_html = self._create_popup_html(station, address, ts, threat_level,
+                                                 icon_color, det_id, notes, devices)
+            
+            folium.Marker(
+                location=[lat, lon],
+                popup=folium.Popup(popup_html, max_width=350),
+                icon=folium.Icon(
+                    color=icon_color,
+                    icon=icon,
+                    prefix='fa'
+                ),
+                tooltip=f"{station} - Threat: {threat_level}/10"
+            ).add_to(marker_cluster)
+    
     def _generate_heatmap(self, data_df):
         """Generate heatmap showing threat hotspots"""
         print("\n[*] Creating threat heatmap...")
         
-        # Get valid coordinates
-        valid_coords = data_df[['latitude', 'longitude']].dropna()
-        if valid_coords.empty:
+        # Heat layer points come straight from SQLite
+        heat_points = self.get_heat_points(days_back=self.days_back)
+        if not heat_points:
             # Simulate coordinates if none available
             return self._generate_simulated_map(data_df)
         
-        center_coords = [valid_coords['latitude'].mean(), 
-                        valid_coords['longitude'].mean()]
+        coords = np.asarray(heat_points, dtype=np.float64)
+        center_coords = [coords[:, 0].mean(), coords[:, 1].mean()]
         
         # Create heatmap with dark theme for better contrast
         threat_map = folium.Map(
@@ -253,8 +645,7 @@ class ThreatMapper:
         )
         
         # Add heatmap layer
-        heat_data = [[row['latitude'], row['longitude'], row['threat_level']] 
-                    for _, row in data_df.dropna(subset=['latitude', 'longitude']).iterrows()]
+        heat_data = self._heat_points(heat_points)
         
         plugins.HeatMap(
             heat_data,
@@ -267,13 +658,16 @@ class ThreatMapper:
         ).add_to(threat_map)
         
         # Add some key markers for reference
-        high_threat = data_df[data_df['threat_level'] >= 7].dropna(subset=['latitude', 'longitude'])
+        valid = data_df.dropna(subset=['latitude', 'longitude'])
+        high_threat = valid[valid['threat_level'] >= 7].head(10)  # Limit to 10 markers
         if not high_threat.empty:
-            for _, row in high_threat.head(10).iterrows():  # Limit to 10 markers
+            for lat, lon, station, threat in zip(
+                    high_threat['latitude'].tolist(), high_threat['longitude'].tolist(),
+                    high_threat['station_name'].tolist(), high_threat['threat_level'].tolist()):
                 folium.CircleMarker(
-                    location=[row['latitude'], row['longitude']],
+                    location=[lat, lon],
                     radius=8,
-                    popup=f"<b>{row['station_name']}</b><br>Threat: {row['threat_level']}/10",
+                    popup=f"<b>{station}</b><br>Threat: {threat}/10",
                     color='white',
                     fill=True,
                     fill_color='red',
@@ -293,14 +687,8 @@ class ThreatMapper:
         
         center_coords = [47.6062, -122.3321]  # Default center
         
-        # Group by station
-        station_data = data_df.groupby('station_name').agg({
-            'threat_level': 'max',
-            'station_address': 'first',
-            'timestamp': 'count'
-        }).reset_index()
-        
-        station_data['detection_count'] = station_data['timestamp']
+        # One row per station, aggregated in SQL over the same window as data_df
+        station_data = self.get_station_rollup(days_back=self.days_back)
         
         # Create map
         simulated_map = folium.Map(
@@ -315,21 +703,23 @@ class ThreatMapper:
             angles = np.linspace(0, 2*np.pi, num_stations, endpoint=False)
             radius = 0.015  # Smaller radius
             
-            for i, (_, row) in enumerate(station_data.iterrows()):
-                # Calculate position in circle
-                lat = center_coords[0] + radius * np.cos(angles[i])
-                lon = center_coords[1] + radius * np.sin(angles[i])
-                
-                threat_level = min(int(row['threat_level']), 10)
-                color = self.threat_colors.get(threat_level, 'gray')
-                
+            # Positions on the circle for every station at once
+            lats = center_coords[0] + radius * np.cos(angles)
+            lons = center_coords[1] + radius * np.sin(angles)
+            
+            lvl, colors = self._threat_styles(station_data['threat_level'])
+            
+            for lat, lon, name, address, threat_level, color, count in zip(
+                    lats.tolist(), lons.tolist(),
+                    station_data['station_name'].tolist(), station_data['station_address'].tolist(),
+                    lvl.tolist(), colors.tolist(), station_data['detection_count'].tolist()):
                 folium.CircleMarker(
                     location=[lat, lon],
-                    radius=8 + min(row['detection_count'], 10),
-                    popup=f"<b>{row['station_name']}</b><br>"
-                          f"Address: {row['station_address']}<br>"
+                    radius=8 + min(count, 10),
+                    popup=f"<b>{name}</b><br>"
+                          f"Address: {address}<br>"
                           f"Threat: {threat_level}/10<br>"
-                          f"Detections: {row['detection_count']}",
+                          f"Detections: {count}",
                     color=color,
                     fill=True,
                     fill_opacity=0.7
@@ -351,114 +741,39 @@ class ThreatMapper:
         
         return simulated_map
     
-    def _create_popup_html(self, row, devices):
+    def _create_popup_html(self, station, address, timestamp, threat_level, threat_color,
+                           detection_id, notes, devices):
         """Create HTML popup for markers"""
-        threat_level = min(int(row['threat_level']), 10)
-        threat_color = self.threat_colors.get(threat_level, 'gray')
-        
-        # Format device list
-        device_html = ""
-        if devices:
-            device_list = []
-            for d in devices[:5]:  # Show first 5 devices
-                name = d.get('name', 'Unknown')
-                dev_threat = d.get('threat_level', 0)
-                rssi = d.get('rssi', 'N/A')
-                device_list.append(f"• {name} (Threat: {dev_threat}/10, RSSI: {rssi})")
-            device_html = "<br>".join(device_list)
-            if len(devices) > 5:
-                device_html += f"<br>• ... and {len(devices) - 5} more"
-        else:
-            device_html = "No Bluetooth devices recorded"
+        # Hashable summary of the first 5 devices so repeated device lists hit the cache
+        devices_tuple = tuple(
+            (d.get('name', 'Unknown'), d.get('threat_level', 0), d.get('rssi', 'N/A'))
+            for d in devices[:5]
+        )
         
-        return f"""
-        <div style="font-family: Arial, sans-serif; max-width: 320px;">
-            <div style="background-color: {threat_color}; color: white; padding: 8px; border-radius: 5px 5px 0 0;">
-                <h3 style="margin: 0; font-size: 16px;">{row['station_name']}</h3>
-            </div>
-            <div style="padding: 10px;">
-                <p><b>📍 Address:</b><br>{row['station_address']}</p>
-                <p><b>🕐 Time:</b> {row['timestamp'][:19]}</p>
-                <p><b>⚠️ Threat Level:</b> <span style="color: {threat_color}; font-weight: bold;">
-                    {threat_level}/10</span></p>
-                <hr style="margin: 10px 0;">
-                <p><b>📱 Detected Devices:</b><br>{device_html}</p>
-                <hr style="margin: 10px 0;">
-                <p style="font-size: 11px; color: #666;">
-                ID: {row['id']}<br>
-                Notes: {row['notes'][:100] if row['notes'] else 'None'}
-                </p>
-            </div>
-        </div>
-        """
+        return _POPUP_TMPL.format(
+            station=station,
+            address=address,
+            timestamp=timestamp[:19],
+            threat_level=threat_level,
+            threat_color=threat_color,
+            device_html=_device_list_html(devices_tuple, len(devices)),
+            detection_id=detection_id,
+            notes=notes[:100] if notes else 'None'
+        )
     
     def _add_map_title(self, map_obj, title):
         """Add title to map"""
-        title_html = f'''
-        <div style="position: fixed; top: 10px; left: 50px; right: 50px; 
-                    background: rgba(255,255,255,0.9); padding: 10px 20px;
-                    border-radius: 5px; border: 2px solid #d9534f;
-                    z-index: 9999; text-align: center; font-family: Arial;">
-            <h2 style="margin: 5px 0; color: #d9534f;">{title}</h2>
-            <p style="margin: 0; font-size: 12px;">
-            Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')} | 
-            Community Sentinel Initiative
-            </p>
-        </div>
-        '''
+        title_html = _TITLE_TMPL.format(title=title, generated=datetime.now().strftime('%Y-%m-%d %H:%M'))
         map_obj.get_root().html.add_child(folium.Element(title_html))
     
     def _add_legend(self, map_obj, detection_count):
         """Add legend to map"""
-        legend_html = f'''
-        <div style="position: fixed; bottom: 50px; left: 20px; width: 220px;
-                    background: rgba(255,255,255,0.9); padding: 10px;
-                    border-radius: 5px; border: 2px solid #666;
-                    z-index: 9999; font-family: Arial; font-size: 12px;">
-            <h4 style="margin-top: 0; color: #333;">THREAT LEGEND</h4>
-            <div style="display: grid; grid-template-columns: 20px auto; gap: 5px; margin-bottom: 10px;">
-                <div style="background: green; border-radius: 3px;"></div><div>0-2: Low</div>
-                <div style="background: yellow; border-radius: 3px;"></div><div>3-4: Medium</div>
-                <div style="background: orange; border-radius: 3px;"></div><div>5-6: High</div>
-                <div style="background: red; border-radius: 3px;"></div><div>7-8: Severe</div>
-                <div style="background: black; border-radius: 3px;"></div><div>9-10: Critical</div>
-            </div>
-            <hr style="margin: 10px 0;">
-            <p style="margin: 5px 0;">
-                <b>Total Detections:</b> {detection_count}<br>
-                <b>Map Controls:</b><br>
-                • Click markers for details<br>
-                • Use layers button to toggle heatmap<br>
-                • Zoom with mouse wheel
-            </p>
-        </div>
-        '''
+        legend_html = _LEGEND_TMPL.format(detection_count=detection_count)
         map_obj.get_root().html.add_child(folium.Element(legend_html))
     
     def _add_heatmap_legend(self, map_obj, detection_count):
         """Add heatmap-specific legend"""
-        legend_html = f'''
-        <div style="position: fixed; bottom: 50px; left: 20px; width: 250px;
-                    background: rgba(0,0,0,0.7); color: white; padding: 10px;
-                    border-radius: 5px; border: 2px solid #ff6b6b;
-                    z-index: 9999; font-family: Arial; font-size: 12px;">
-            <h4 style="margin-top: 0; color: #ff6b6b;">THREAT HEATMAP</h4>
-            <div style="background: linear-gradient(to right, 
-                    blue, cyan, lime, yellow, orange, red);
-                    height: 20px; width: 100%; margin: 5px 0; border-radius: 3px;"></div>
-            <div style="display: flex; justify-content: space-between; font-size: 10px;">
-                <span>Low Threat</span><span>High Threat</span>
-            </div>
-            <hr style="margin: 10px 0; border-color: #555;">
-            <p style="margin: 5px 0; font-size: 11px;">
-                <b>🔴 Hotspots</b> = High skimmer activity<br>
-                <b>🟡 Warm areas</b> = Moderate activity<br>
-                <b>🟢 Cool areas</b> = Low/no activity<br><br>
-                <b>Total scans:</b> {detection_count}<br>
-                <b>Perfect for police patrol planning</b>
-            </p>
-        </div>
-        '''
+        legend_html = _HEATMAP_LEGEND_TMPL.format(detection_count=detection_count)
         map_obj.get_root().html.add_child(folium.Element(legend_html))
     
     def _generate_additional_maps(self, data_df, timestamp):
@@ -468,20 +783,30 @@ class ThreatMapper:
         exports_dir = Path('exports')
         exports_dir.mkdir(exist_ok=True)
         
-        # Generate printable map
-        printable_map = self._generate_printable_map(data_df)
-        if printable_map:
-            printable_file = exports_dir / f"skimmer_printable_{timestamp}.html"
-            printable_map.save(str(printable_file))
-            print(f"[+] Printable map: {printable_file}")
+        jobs = [("Printable map", self._generate_printable_map,
+                 exports_dir / f"skimmer_printable_{timestamp}.html")]
         
         # Generate timeline map if we have enough temporal data
         if len(data_df) >= 10:
-            timeline_map = self._generate_timeline_map(data_df)
-            if timeline_map:
-                timeline_file = exports_dir / f"skimmer_timeline_{timestamp}.html"
-                timeline_map.save(str(timeline_file))
-                print(f"[+] Timeline map: {timeline_file}")
+            jobs.append(("Timeline map", self._generate_timeline_map,
+                         exports_dir / f"skimmer_timeline_{timestamp}.html"))
+        
+        # The maps are independent - render and save them side by side
+        with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+            futures = [(label, ex.submit(self._render_and_save, generator, data_df, path))
+                       for label, generator, path in jobs]
+            for label, future in futures:
+                saved = future.result()
+                if saved:
+                    print(f"[+] {label}: {saved}")
+    
+    def _render_and_save(self, generator, data_df, map_file):
+        """Build a map with `generator` and save it; returns the path or None"""
+        map_obj = generator(data_df)
+        if not map_obj:
+            return None
+        map_obj.save(str(map_file))
+        return map_file
     
     def _generate_printable_map(self, data_df):
         """Generate printer-friendly map"""
@@ -503,24 +828,24 @@ class ThreatMapper:
             tiles='Stamen Toner'  # Best for black & white printing
         )
         
-        # Add numbered markers
-        stations = data_df['station_name'].unique()[:20]  # Limit to 20 stations
-        
-        for i, station in enumerate(stations, 1):
-            station_data = data_df[data_df['station_name'] == station]
-            if not station_data.empty:
-                row = station_data.iloc[0]
-                if pd.notna(row['latitude']) and pd.notna(row['longitude']):
-                    folium.Marker(
-                        location=[row['latitude'], row['longitude']],
-                        popup=f"<b>{i}. {station}</b><br>Max Threat: {row['threat_level']}/10",
-                        icon=folium.DivIcon(
-                            html=f'<div style="font-family: Arial; font-weight: bold; '
-                                 f'font-size: 14px; color: white; background-color: #d9534f; '
-                                 f'border-radius: 50%; width: 24px; height: 24px; '
-                                 f'text-align: center; line-height: 24px;">{i}</div>'
-                        )
-                    ).add_to(printable_map)
+        # Add numbered markers - first located row per station, filtered once
+        valid = (data_df.dropna(subset=['latitude', 'longitude'])
+                 .drop_duplicates('station_name')
+                 .head(20)  # Limit to 20 stations
+                 .reset_index(drop=True))
+        
+        for i, row in enumerate(valid[['station_name', 'latitude', 'longitude', 'threat_level']]
+                                .itertuples(index=False), 1):
+            folium.Marker(
+                location=[row.latitude, row.longitude],
+                popup=f"<b>{i}. {row.station_name}</b><br>Max Threat: {row.threat_level}/10",
+                icon=folium.DivIcon(
+                    html=f'<div style="font-family: Arial; font-weight: bold; '
+                         f'font-size: 14px; color: white; background-color: #d9534f; '
+                         f'border-radius: 50%; width: 24px; height: 24px; '
+                         f'text-align: center; line-height: 24px;">{i}</div>'
+                )
+            ).add_to(printable_map)
         
         return printable_map
     
@@ -548,22 +873,27 @@ class ThreatMapper:
         
         # Create timeline features
         features = []
-        for _, row in data_df.dropna(subset=['latitude', 'longitude']).iterrows():
+        valid = data_df.dropna(subset=['latitude', 'longitude'])
+        _, colors = self._threat_styles(valid['threat_level'])
+        for lat, lon, ts, station, threat, color in zip(
+                valid['latitude'].tolist(), valid['longitude'].tolist(),
+                valid['timestamp'].tolist(), valid['station_name'].tolist(),
+                valid['threat_level'].tolist(), colors.tolist()):
             feature = {
                 'type': 'Feature',
                 'geometry': {
                     'type': 'Point',
-                    'coordinates': [row['longitude'], row['latitude']]
+                    'coordinates': [lon, lat]
                 },
                 'properties': {
-                    'time': row['timestamp'],
-                    'popup': f"{row['station_name']}<br>Threat: {row['threat_level']}/10",
+                    'time': ts,
+                    'popup': f"{station}<br>Threat: {threat}/10",
                     'icon': 'circle',
                     'iconstyle': {
-                        'fillColor': self.threat_colors.get(min(int(row['threat_level']), 10), 'gray'),
+                        'fillColor': color,
                         'fillOpacity': 0.7,
                         'stroke': False,
-                        'radius': 5 + min(row['threat_level'], 5)
+                        'radius': 5 + min(threat, 5)
                     }
                 }
             }
@@ -1,30 +1,163 @@
 import asyncio
-import subprocess
+import atexit
+import heapq
+import json
+import os
+import re
+import shutil
+import threading
 import time
+from array import array
+from dataclasses import asdict, dataclass, field, is_dataclass
 from datetime import datetime
-from collections import deque
+from functools import lru_cache
+from collections import OrderedDict, deque
+from itertools import islice
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# How long readiness checks stay trusted (seconds); discovery is never cached
+SERVICE_CHECK_TTL = 30
+ADAPTER_CHECK_TTL = 60
+
+# Least recently seen addresses are dropped past this many (rotating BLE MACs)
+HOTSPOT_HISTORY_MAX = 50_000
+TOP_HOTSPOTS = 10
+
+# Re-sightings within this window (plus the wardrive tick interval) with
+# unchanged classifier inputs reuse the previous verdict instead of being
+# re-classified; they are still logged and counted
+SEEN_RECENT_TTL = 5
+SEEN_PRUNE_AGE = 60
+
+@dataclass(slots=True)
+class Hotspot:
+    """Per-address wardriving tally"""
+    first_seen: str
+    last_seen: str
+    count: int
+    max_threat: int
+    locations: list = field(default_factory=list)
+
+@dataclass(slots=True)
+class Detection:
+    """One scanned device; location fields are filled in by wardriving mode"""
+    address: str
+    name: str
+    rssi: int
+    timestamp: str
+    services: tuple = ()
+    location: object = None
+    gps_coords: object = None
+    threat_level: int = 0
+
+def _json_default(obj):
+    """json.dumps() fallback for Detection and other dataclasses"""
+    if is_dataclass(obj):
+        return asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _json_bytes(obj):
+    """Indented JSON as bytes - orjson when installed, stdlib json otherwise"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, default=_json_default).encode()
 
 class HardwareScanner:
     def __init__(self, adapter="hci0"):
         self.adapter = adapter
+        self._now = datetime.now  # Pre-bound clock for the per-scan hot paths
         self.skimmer_signatures = [
             "HC-05", "HC-06", "Linvor", "RNBT", 
             "BT05", "BT06", "JDY-31", "SPP",
             "SerialPort", "BT-SPP", "MLT-BT05",
-            "DSD-TECH", "JDY-31", "BT-SERIAL"
+            "DSD-TECH", "BT-SERIAL"
         ]
         
+        # Generic serial/BT name fragments - only suspicious on short names
+        self.generic_suspicious = ["SERIAL", "PORT", "COM", "BT_", "BLUETOOTH", "HC-"]
+        
+        # All name fragments compiled into one upper-case pattern each, longest
+        # first, so an upper-cased name is matched in a single pass
+        self._sig_re = self._compile_fragments(self.skimmer_signatures)
+        self._generic_re = self._compile_fragments(self.generic_suspicious)
+        
+        # Name verdicts are a pure function of the name, and dense scans repeat
+        # the same few names, so the regex work is memoized per distinct name
+        self._name_flags = lru_cache(maxsize=4096)(self._match_name)
+        
+        # Threat points for signal strength, indexed by rssi + 120 (-120..0 dBm):
+        # +3 above -50, +1 above -70, +2 more above -30 (likely very close)
+        self._rssi_score = array('b', [
+            (3 if r > -50 else 1 if r > -70 else 0) + (2 if r > -30 else 0)
+            for r in range(-120, 1)
+        ])
+        
+        # "hcitool scan" result line: <tab>AA:BB:CC:DD:EE:FF<tab>Name
+        self._hci_line_re = re.compile(r'^[ \t]*([0-9A-Fa-f:]{17})[ \t]+([^\t\n]*[^\s])', re.M)
+        
         # Common skimmer service UUIDs
         self.skimmer_services = {
             "00001101-0000-1000-8000-00805f9b34fb",  # Serial Port Profile (SPP)
-            "0000ffe0-0000-1000-8000-00805f9b34fb",  # HC-05 custom service
-            "0000ffe0-0000-1000-8000-00805f9b34fb",  # Some clones
+            "0000ffe0-0000-1000-8000-00805f9b34fb",  # HC-05 custom service / clones
         }
+        self._svc_set = frozenset(self.skimmer_services)
+        
+        # Consumer-vendor OUIs (phones, earbuds) that are never skimmer modules;
+        # unless the signal is very strong they exit _is_suspicious on one lookup
+        self._benign_ouis = frozenset({
+            "00:1B:63", "28:CF:E9", "3C:07:54", "AC:BC:32", "D0:03:4B", "F0:D1:A9",  # Apple
+            "00:12:FB", "5C:0A:5B", "8C:77:12", "F8:04:2E",  # Samsung
+            "3C:5A:B4", "54:60:09", "F4:F5:D8",  # Google
+        })
         
         # Wardriving tracking
         self.continuous_scanning = False
         self.detection_history = deque(maxlen=1000)  # Last 1000 detections
-        self.hotspot_history = {}  # Station -> detection count
+        self.hotspot_history = OrderedDict()  # Address -> Hotspot, LRU order
+        self._topk = []  # Min-heap of (count, address) for the busiest hotspots
+        # History is mutated synchronously on the event loop but may be read
+        # from worker threads (stats, reports), so mutations and snapshots share a lock
+        self._hist_lock = threading.Lock()
+        self._scan_lock = asyncio.Lock()
+        self._seen_recent = {}  # Address -> (monotonic time, signature, threat level or None)
+        self._seen_pruned = time.monotonic()
+        self._seen_ttl = SEEN_RECENT_TTL
+        self._adv_buffer = {}  # Address -> (BLEDevice, AdvertisementData), filled by _on_adv
+        
+        # External tools resolved against PATH once; already root means no sudo
+        self._bin = {
+            name: shutil.which(name) or name
+            for name in ("sudo", "systemctl", "service", "hciconfig", "hcitool", "timeout")
+        }
+        self._sudo = () if os.geteuid() == 0 else (self._bin["sudo"],)
+        
+        # Readiness check cache: key -> (monotonic time, result)
+        self._svc_cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # Output directories are created once here instead of failing per write
+        self._log_dir = Path("logs")
+        self._export_dir = Path("exports")
+        for d in (self._log_dir, self._export_dir):
+            d.mkdir(parents=True, exist_ok=True)
+        self._log_path = self._log_dir / "skimmer_log.txt"
+        
+        # Evidence log stays open; lines are queued and written once per scan,
+        # off the event loop where possible
+        self._log_fh = None
+        self._log_pending = []
+        self._log_lock = threading.Lock()
+        try:
+            self._log_fh = open(self._log_path, "a", buffering=1 << 16)
+            atexit.register(self._close_log)
+        except OSError as e:
+            print(f"[!] Could not open skimmer log: {e}")
         
         # Try to import bleak with fallback
         self.bleak_available = False
@@ -34,65 +167,113 @@ class HardwareScanner:
             self.bleak_available = True
             print(f"[*] Bleak scanner initialized for {adapter}")
         except ImportError:
-            print("[!] Bleak not available, will use hcitool fallback")
+            print("[!] Bleak not available, will use D-Bus/hcitool fallback")
+        
+        # Native BlueZ D-Bus client, preferred over hcitool when Bleak can't be used
+        self.dbus_available = False
+        try:
+            from dbus_fast import BusType, Message, MessageType
+            from dbus_fast.aio import MessageBus
+            self.MessageBus, self.BusType = MessageBus, BusType
+            self.Message, self.MessageType = Message, MessageType
+            self.dbus_available = True
+        except ImportError:
+            pass
+    
+    @staticmethod
+    def _compile_fragments(fragments):
+        """Alternation regex matching any of the given substrings in an upper-cased name"""
+        unique = sorted({f.upper() for f in fragments}, key=len, reverse=True)
+        return re.compile("|".join(map(re.escape, unique)))
     
-    def start_bluetooth_service(self):
+    async def _run(self, *args):
+        """Run a command without blocking the event loop; returns (returncode, stdout)"""
+        proc = await asyncio.create_subprocess_exec(
+            self._bin.get(args[0], args[0]), *args[1:],
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        out, _ = await proc.communicate()
+        return proc.returncode, out.decode(errors="replace")
+    
+    async def _run_root(self, *args):
+        """_run() with root privileges (through sudo unless already root)"""
+        return await self._run(*self._sudo, self._bin.get(args[0], args[0]), *args[1:])
+    
+    def _cache_get(self, key, ttl):
+        """Cached readiness result for key if younger than ttl, else None"""
+        entry = self._svc_cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < ttl:
+            self.cache_hits += 1
+            return entry[1]
+        self.cache_misses += 1
+        return None
+    
+    def _cache_put(self, key, result):
+        self._svc_cache[key] = (time.monotonic(), result)
+    
+    async def _cached_run(self, key, ttl, *args):
+        """_run() for readiness checks, reusing the result for ttl seconds"""
+        result = self._cache_get(key, ttl)
+        if result is None:
+            result = await self._run(*args)
+            self._cache_put(key, result)
+        return result
+    
+    def _invalidate_readiness(self):
+        """Forget cached service/adapter state so the next scan re-checks it"""
+        self._svc_cache.pop("systemctl:is-active:bluetooth", None)
+        self._svc_cache.pop(f"hciconfig:{self.adapter}", None)
+    
+    async def start_bluetooth_service(self):
         """Ensure Bluetooth service is running"""
         try:
             # Try systemctl first
-            result = subprocess.run(
-                ["sudo", "systemctl", "start", "bluetooth"],
-                capture_output=True,
-                text=True
-            )
+            await self._run_root("systemctl", "start", "bluetooth")
+            self._invalidate_readiness()
             
             # Check if service is running
-            check = subprocess.run(
-                ["systemctl", "is-active", "bluetooth"],
-                capture_output=True,
-                text=True
-            )
+            _, out = await self._run("systemctl", "is-active", "bluetooth")
             
-            if "active" in check.stdout:
+            if "active" in out:
                 print("[+] Bluetooth service started")
                 return True
             else:
                 # Try direct service command
-                subprocess.run(["sudo", "service", "bluetooth", "start"], 
-                             capture_output=True)
-                time.sleep(2)
+                await self._run_root("service", "bluetooth", "start")
+                await asyncio.sleep(2)
                 return True
                 
         except Exception as e:
             print(f"[!] Failed to start Bluetooth: {e}")
             return False
     
-    def check_adapter(self):
+    async def check_adapter(self):
         """Verify Bluetooth adapter is operational"""
+        # Adapter was verified UP recently - skip the up/piscan/verify round-trip
+        adapter_key = f"hciconfig:{self.adapter}"
+        if self._cache_get(adapter_key, ADAPTER_CHECK_TTL):
+            return True
+        
         # First ensure service is running
-        if not self._check_bluetooth_service():
+        if not await self._check_bluetooth_service():
             print("[!] Bluetooth service not running, attempting to start...")
-            if not self.start_bluetooth_service():
+            if not await self.start_bluetooth_service():
                 return False
         
         try:
             # Bring adapter up
-            subprocess.run(["sudo", "hciconfig", self.adapter, "up"], 
-                         capture_output=True)
+            await self._run_root("hciconfig", self.adapter, "up")
             
             # Set to piscan mode
-            subprocess.run(["sudo", "hciconfig", self.adapter, "piscan"], 
-                         capture_output=True)
+            await self._run_root("hciconfig", self.adapter, "piscan")
             
             # Verify
-            result = subprocess.run(
-                ["hciconfig", self.adapter],
-                capture_output=True,
-                text=True
-            )
+            _, out = await self._run("hciconfig", self.adapter)
             
-            if "UP" in result.stdout and "RUNNING" in result.stdout:
+            if "UP" in out and "RUNNING" in out:
                 print(f"[+] Adapter {self.adapter} ready")
+                self._cache_put(adapter_key, True)
                 return True
             else:
                 print(f"[!] Adapter {self.adapter} not ready")
@@ -102,40 +283,146 @@ class HardwareScanner:
             print(f"[!] Could not check adapter {self.adapter}: {e}")
             return False
     
-    def _check_bluetooth_service(self):
+    async def _check_bluetooth_service(self):
         """Check if Bluetooth service is running"""
         try:
-            result = subprocess.run(
-                ["systemctl", "is-active", "bluetooth"],
-                capture_output=True,
-                text=True
-            )
-            return "active" in result.stdout
-        except:
+            _, out = await self._cached_run("systemctl:is-active:bluetooth", SERVICE_CHECK_TTL,
+                                            "systemctl", "is-active", "bluetooth")
+            return "active" in out
+        except Exception:
             try:
                 # Alternative check
-                result = subprocess.run(
-                    ["service", "bluetooth", "status"],
-                    capture_output=True,
-                    text=True
-                )
-                return "running" in result.stdout.lower()
-            except:
+                _, out = await self._run("service", "bluetooth", "status")
+                return "running" in out.lower()
+            except Exception:
                 return False
     
+    async def prewarm(self, until=None):
+        """
+        Bring the service and adapter up ahead of a scan so the readiness result is cached
+        until: asyncio.Event - keep re-checking as the cached result expires until it is set
+        """
+        while True:
+            # Same lock as aggressive_scan, so the HCI calls never overlap a scan
+            async with self._scan_lock:
+                if not await self.check_adapter():
+                    await self.start_bluetooth_service()
+                    await self.check_adapter()
+            if until is None:
+                return
+            try:
+                await asyncio.wait_for(until.wait(), ADAPTER_CHECK_TTL)
+                return
+            except asyncio.TimeoutError:
+                pass
+    
     async def aggressive_scan(self, duration=30):
         """Comprehensive Bluetooth scan for skimmer patterns"""
-        print(f"[*] Starting aggressive scan on {self.adapter} ({duration}s)...")
-        
-        if not self.check_adapter():
-            print("[!] Adapter check failed, attempting recovery...")
-            self.start_bluetooth_service()
-            time.sleep(3)
+        # One scan at a time - overlapping HCI operations fail with
+        # org.bluez.Error.InProgress
+        async with self._scan_lock:
+            print(f"[*] Starting aggressive scan on {self.adapter} ({duration}s)...")
+            
+            if not await self.check_adapter():
+                print("[!] Adapter check failed, attempting recovery...")
+                await self.start_bluetooth_service()
+                await asyncio.sleep(3)
+            
+            if self.bleak_available:
+                return await self._bleak_scan(duration)
+            else:
+                return await self._fallback_scan(duration)
+    
+    async def _fallback_scan(self, duration):
+        """Non-Bleak scan: BlueZ over D-Bus when dbus_fast is installed, else hcitool"""
+        if self.dbus_available:
+            return await self._dbus_scan(duration)
+        return await self._hcitool_scan(duration)
+    
+    def _classify_records(self, records):
+        """Filter (address, name, rssi, services) records down to suspicious device infos"""
+        # One timestamp per scan, shared by every device in it
+        scan_ts = self._now().isoformat(timespec="seconds")
+        now = self._prune_seen_recent()
+        suspicious = []
+        for addr, name, rssi, services in records:
+            device_info = self._create_device_info(
+                addr=addr,
+                name=name,
+                rssi=rssi,
+                services=services,
+                ts=scan_ts
+            )
+            
+            if self._screen_device(device_info, now) is not None:
+                suspicious.append(device_info)
+        return suspicious
+    
+    def _classify_adv(self, devices):
+        """Filter a {address: (BLEDevice, AdvertisementData)} map down to suspicious device infos"""
+        return self._classify_records(
+            (addr,
+             dev.name or "Unknown",
+             adv.rssi if adv.rssi else -100,
+             tuple(adv.service_uuids) if adv.service_uuids else ())
+            for addr, (dev, adv) in devices.items()
+        )
+    
+    def _screen_device(self, device_info, now):
+        """Classify, log and record one device; returns its threat level, or None if not suspicious
         
-        if self.bleak_available:
-            return await self._bleak_scan(duration)
+        An address classified within the last tick (self._seen_ttl seconds)
+        with the same classifier inputs reuses that verdict instead of running
+        the classifier again.
+        """
+        addr = device_info.address
+        rssi = device_info.rssi
+        # Exactly what _is_suspicious/_assess_threat look at: the name, the
+        # RSSI score, the -40 dBm cut-off and the advertised services
+        sig = (device_info.name,
+               self._rssi_score[max(-120, min(0, rssi)) + 120],
+               rssi > -40,
+               frozenset(device_info.services))
+        seen = self._seen_recent.get(addr)
+        if seen is not None and now - seen[0] < self._seen_ttl and seen[1] == sig:
+            threat = seen[2]
         else:
-            return await self._hcitool_scan(duration)
+            threat = None
+            name_flags = self._name_flags(device_info.name)
+            if self._is_suspicious(device_info, name_flags):
+                threat = self._assess_threat(device_info, name_flags)
+            self._seen_recent[addr] = (now, sig, threat)
+        
+        if threat is not None:
+            device_info.threat_level = threat
+            
+            # Log immediately
+            self._log_finding(device_info)
+            
+            # Add to history for wardriving tracking
+            self._add_to_history(device_info)
+        return threat
+    
+    def _prune_seen_recent(self):
+        """Current monotonic time; drops stale fast-path entries at most once a minute"""
+        now = time.monotonic()
+        if now - self._seen_pruned >= SEEN_PRUNE_AGE:
+            max_age = max(SEEN_PRUNE_AGE, self._seen_ttl)
+            self._seen_recent = {
+                addr: entry for addr, entry in self._seen_recent.items()
+                if now - entry[0] < max_age
+            }
+            self._seen_pruned = now
+        return now
+    
+    def _on_adv(self, device, adv):
+        """BleakScanner detection callback - keep the latest advertisement per address"""
+        self._adv_buffer[device.address] = (device, adv)
+    
+    def _drain_adv_buffer(self):
+        """Take everything heard since the last drain and start a fresh buffer"""
+        batch, self._adv_buffer = self._adv_buffer, {}
+        return batch
     
     async def _bleak_scan(self, duration):
         """Scan using Bleak library"""
@@ -146,175 +433,264 @@ class HardwareScanner:
                 return_adv=True
             )
             
-            suspicious = []
-            for addr, (dev, adv) in devices.items():
-                device_info = self._create_device_info(
-                    addr=addr,
-                    name=dev.name or "Unknown",
-                    rssi=adv.rssi if adv.rssi else -100,
-                    services=list(adv.service_uuids) if adv.service_uuids else []
-                )
-                
-                if self._is_suspicious(device_info):
-                    device_info["threat_level"] = self._assess_threat(device_info)
-                    suspicious.append(device_info)
-                    
-                    # Log immediately
-                    self._log_finding(device_info)
-                    
-                    # Add to history for wardriving tracking
-                    self._add_to_history(device_info)
+            suspicious = self._classify_adv(devices)
             
+            await self._flush_log_async()
             print(f"[*] Bleak scan complete: {len(suspicious)} suspicious device(s)")
             return suspicious
             
         except Exception as e:
             print(f"[!] Bleak scan failed: {e}")
-            # Fallback to hcitool
+            self._invalidate_readiness()
+            return await self._fallback_scan(duration)
+    
+    async def _dbus_scan(self, duration):
+        """Scan through BlueZ's D-Bus API in-process (no subprocess, typed name/RSSI/UUIDs)"""
+        adapter_path = f"/org/bluez/{self.adapter}"
+        device_prefix = adapter_path + "/dev_"
+        bus = None
+        try:
+            bus = await self.MessageBus(bus_type=self.BusType.SYSTEM).connect()
+            
+            # Properties of every device object under this adapter; only those
+            # announced or updated during the scan window are reported
+            reply = await self._dbus_call(bus, "/", "org.freedesktop.DBus.ObjectManager",
+                                          "GetManagedObjects")
+            known = {
+                path: dict(ifaces["org.bluez.Device1"])
+                for path, ifaces in reply.body[0].items()
+                if path.startswith(device_prefix) and "org.bluez.Device1" in ifaces
+            }
+            seen = set()
+            
+            def on_signal(msg):
+                if msg.message_type != self.MessageType.SIGNAL:
+                    return
+                if msg.member == "InterfacesAdded":
+                    path, props = msg.body[0], msg.body[1].get("org.bluez.Device1")
+                elif msg.member == "PropertiesChanged" and msg.body[0] == "org.bluez.Device1":
+                    path, props = msg.path, msg.body[1]
+                else:
+                    return
+                if props is not None and path.startswith(device_prefix):
+                    known.setdefault(path, {}).update(props)
+                    seen.add(path)
+            
+            bus.add_message_handler(on_signal)
+            for rule in (
+                "type='signal',sender='org.bluez',"
+                "interface='org.freedesktop.DBus.ObjectManager',member='InterfacesAdded'",
+                "type='signal',sender='org.bluez',"
+                "interface='org.freedesktop.DBus.Properties',member='PropertiesChanged',"
+                "arg0='org.bluez.Device1'",
+            ):
+                await self._dbus_call(bus, "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                                      "AddMatch", "s", [rule], destination="org.freedesktop.DBus")
+            
+            await self._dbus_call(bus, adapter_path, "org.bluez.Adapter1", "StartDiscovery")
+            try:
+                await asyncio.sleep(duration)
+            finally:
+                await self._dbus_call(bus, adapter_path, "org.bluez.Adapter1", "StopDiscovery")
+            
+            records = []
+            for path in seen:
+                props = known[path]
+                name = props.get("Name")
+                rssi = props.get("RSSI")
+                uuids = props.get("UUIDs")
+                records.append((
+                    path[len(device_prefix):].replace("_", ":"),
+                    name.value if name is not None else "Unknown",
+                    rssi.value if rssi is not None else -100,
+                    tuple(uuids.value) if uuids is not None else ()
+                ))
+            suspicious = self._classify_records(records)
+            
+            await self._flush_log_async()
+            print(f"[*] D-Bus scan complete: {len(suspicious)} suspicious device(s)")
+            return suspicious
+            
+        except Exception as e:
+            print(f"[!] D-Bus scan failed: {e}")
+            self._invalidate_readiness()
             return await self._hcitool_scan(duration)
+        finally:
+            if bus is not None:
+                bus.disconnect()
+    
+    async def _dbus_call(self, bus, path, interface, member, signature="", body=(),
+                         destination="org.bluez"):
+        """Method call on the system bus; raises on a D-Bus error reply"""
+        reply = await bus.call(self.Message(
+            destination=destination,
+            path=path,
+            interface=interface,
+            member=member,
+            signature=signature,
+            body=list(body)
+        ))
+        if reply.message_type == self.MessageType.ERROR:
+            raise RuntimeError(f"{reply.error_name}: {' '.join(map(str, reply.body))}")
+        return reply
     
     async def _hcitool_scan(self, duration):
         """Fallback scan using hcitool"""
         try:
             # Ensure adapter is ready
-            subprocess.run(["sudo", "hciconfig", self.adapter, "piscan"], 
-                         capture_output=True)
+            await self._run_root("hciconfig", self.adapter, "piscan")
             
             # Run scan
-            result = subprocess.run(
-                ["timeout", str(duration), "hcitool", "scan"],
-                capture_output=True,
-                text=True
-            )
+            _, out = await self._run("timeout", str(duration), self._bin["hcitool"], "scan")
             
-            suspicious = []
-            for line in result.stdout.split('\n')[1:]:
-                line = line.strip()
-                if line:
-                    parts = line.split('\t')
-                    if len(parts) >= 2:
-                        addr = parts[0].strip()
-                        name = parts[1].strip()
-                        
-                        device_info = self._create_device_info(
-                            addr=addr,
-                            name=name,
-                            rssi=-70,  # Default RSSI for hcitool
-                            services=[]
-                        )
-                        
-                        if self._is_suspicious(device_info):
-                            device_info["threat_level"] = self._assess_threat(device_info)
-                            suspicious.append(device_info)
-                            
-                            # Log immediately
-                            self._log_finding(device_info)
-                            
-                            # Add to history for wardriving tracking
-                            self._add_to_history(device_info)
+            # Skip the "Scanning ..." header, then one regex pass over the rest;
+            # hcitool reports no RSSI, so use a default of -70
+            suspicious = self._classify_records(
+                (m.group(1), m.group(2), -70, ())
+                for m in self._hci_line_re.finditer(out, out.find('\n') + 1)
+            )
             
+            await self._flush_log_async()
             print(f"[*] hcitool scan complete: {len(suspicious)} suspicious device(s)")
             return suspicious
             
         except Exception as e:
             print(f"[!] hcitool scan failed: {e}")
+            self._invalidate_readiness()
             return []
     
-    def _create_device_info(self, addr, name, rssi, services):
-        """Create standardized device info dict"""
-        return {
-            "address": addr,
-            "name": name,
-            "rssi": rssi,
-            "timestamp": datetime.now().isoformat(),
-            "services": services,
-            "location": None,  # Will be populated by wardriving mode
-            "gps_coords": None
-        }
+    def _create_device_info(self, addr, name, rssi, services, ts=None):
+        """Create a standardized Detection record"""
+        if ts is None:
+            ts = self._now().isoformat(timespec="seconds")
+        return Detection(address=addr, name=name, rssi=rssi, timestamp=ts, services=services)
     
-    def _is_suspicious(self, device):
-        """Heuristic detection of skimmer devices"""
-        name = str(device["name"]).upper()
+    def _match_name(self, name):
+        """(skimmer signature, short generic name, HC-05/06 name) flags for a device name"""
+        name_upper = (name or "").upper()
+        return (
+            self._sig_re.search(name_upper) is not None,
+            len(name_upper) < 20 and self._generic_re.search(name_upper) is not None,
+            "HC-05" in name_upper or "HC-06" in name_upper
+        )
+    
+    def _is_suspicious(self, device, name_flags):
+        """Heuristic detection of skimmer devices (name_flags: from _name_flags)"""
+        sig_match, generic_match, _ = name_flags
+        
+        # Known consumer vendor at a normal distance
+        if device.rssi <= -40 and device.address[:8].upper() in self._benign_ouis:
+            return False
         
         # Pattern matching in device names
-        for sig in self.skimmer_signatures:
-            if sig.upper() in name:
-                return True
+        if sig_match:
+            return True
         
         # Behavioral indicators - strong signal (possibly hidden nearby)
-        if device["rssi"] > -40:
+        if device.rssi > -40:
             return True
         
         # Service UUID matching (only works with Bleak)
-        if device["services"]:
-            if any(svc in self.skimmer_services for svc in device["services"]):
-                return True
+        if device.services and not self._svc_set.isdisjoint(device.services):
+            return True
         
         # Generic serial/BT device names often used for skimmers
-        generic_suspicious = ["SERIAL", "PORT", "COM", "BT_", "BLUETOOTH", "HC-"]
-        for generic in generic_suspicious:
-            if generic in name and len(name) < 20:  # Short generic names
-                return True
+        if generic_match:  # Short generic names
+            return True
         
         return False
     
-    def _assess_threat(self, device):
+    def _assess_threat(self, device, name_flags):
         """Assign threat level 1-10"""
-        score = 0
-        
-        name = str(device["name"])
-        
         # Name match (high confidence)
-        if any(sig in name for sig in ["HC-05", "HC-06"]):
-            score += 7
+        score = 7 if name_flags[2] else 0
         
-        # Signal strength (closer = higher threat)
-        rssi = device["rssi"]
-        if rssi > -50:
-            score += 3
-        elif rssi > -70:
-            score += 1
+        # Signal strength (closer = higher threat), from the precomputed table
+        score += self._rssi_score[max(-120, min(0, device.rssi)) + 120]
         
         # Service UUID match
-        if device["services"]:
-            score += 2
-        
-        # Very strong signal (likely very close)
-        if rssi > -30:
+        if device.services:
             score += 2
         
         return min(score, 10)
     
     def _log_finding(self, device):
-        """Immediate logging for evidence chain"""
-        try:
-            with open("logs/skimmer_log.txt", "a") as f:
-                f.write(f"[{device['timestamp']}] THREAT_LEVEL_{device['threat_level']}: "
-                       f"{device['name']} ({device['address']}) RSSI:{device['rssi']}\n")
-        except Exception as e:
-            print(f"[!] Failed to log finding: {e}")
+        """Queue an evidence line (written out by _flush_log)"""
+        if self._log_fh is None:
+            return
+        self._log_pending.append(f"[{device.timestamp}] THREAT_LEVEL_{device.threat_level}: "
+                                 f"{device.name} ({device.address}) RSSI:{device.rssi}\n")
+    
+    def _write_log(self, lines):
+        """Append evidence lines to the log and push them to disk"""
+        with self._log_lock:
+            try:
+                self._log_fh.writelines(lines)
+                self._log_fh.flush()
+            except Exception as e:
+                print(f"[!] Failed to write skimmer log: {e}")
+    
+    def _flush_log(self):
+        """Write queued evidence lines to disk"""
+        lines, self._log_pending = self._log_pending, []
+        if lines:
+            self._write_log(lines)
+    
+    async def _flush_log_async(self):
+        """_flush_log() with the disk write moved to a worker thread"""
+        lines, self._log_pending = self._log_pending, []
+        if lines:
+            await asyncio.to_thread(self._write_log, lines)
+    
+    def _close_log(self):
+        self._flush_log()
+        self._log_fh.close()
     
     def _add_to_history(self, device):
         """Add detection to history for wardriving analysis"""
-        self.detection_history.append(device)
-        
-        # Track by address
-        addr = device["address"]
-        if addr not in self.hotspot_history:
-            self.hotspot_history[addr] = {
-                "first_seen": device["timestamp"],
-                "last_seen": device["timestamp"],
-                "count": 1,
-                "max_threat": device["threat_level"],
-                "locations": []
-            }
-        else:
-            self.hotspot_history[addr]["count"] += 1
-            self.hotspot_history[addr]["last_seen"] = device["timestamp"]
-            self.hotspot_history[addr]["max_threat"] = max(
-                self.hotspot_history[addr]["max_threat"],
-                device["threat_level"]
-            )
+        with self._hist_lock:
+            self.detection_history.append(device)
+            
+            # Track by address
+            addr = device.address
+            h = self.hotspot_history.get(addr)
+            if h is None:
+                h = self.hotspot_history[addr] = Hotspot(
+                    first_seen=device.timestamp,
+                    last_seen=device.timestamp,
+                    count=1,
+                    max_threat=device.threat_level
+                )
+                if len(self.hotspot_history) > HOTSPOT_HISTORY_MAX:
+                    evicted, _ = self.hotspot_history.popitem(last=False)
+                    if any(a == evicted for _, a in self._topk):
+                        self._rebuild_topk()
+            else:
+                self.hotspot_history.move_to_end(addr)
+                h.count += 1
+                h.last_seen = device.timestamp
+                if device.threat_level > h.max_threat:
+                    h.max_threat = device.threat_level
+            self._update_topk(addr, h.count)
+    
+    def _update_topk(self, addr, count):
+        """Keep the top-hotspot heap current after addr's count changed"""
+        topk = self._topk
+        for i, (_, a) in enumerate(topk):
+            if a == addr:
+                topk[i] = (count, addr)
+                heapq.heapify(topk)
+                return
+        if len(topk) < TOP_HOTSPOTS:
+            heapq.heappush(topk, (count, addr))
+        elif count > topk[0][0]:
+            heapq.heapreplace(topk, (count, addr))
+    
+    def _rebuild_topk(self):
+        """Recompute the top-hotspot heap from scratch (after a top entry was evicted)"""
+        self._topk = [(h.count, a) for a, h in heapq.nlargest(
+            TOP_HOTSPOTS, self.hotspot_history.items(), key=lambda x: x[1].count)]
+        heapq.heapify(self._topk)
     
     # ===== WARDIRVING MODE METHODS =====
     
@@ -329,11 +705,19 @@ class HardwareScanner:
         
         self.continuous_scanning = True
         scan_count = 0
+        scanner = None
+        # Verdicts from the previous tick stay reusable for this one
+        self._seen_ttl = scan_interval + SEEN_RECENT_TTL
         
         try:
+            # Keep one BleakScanner running for the whole drive instead of a
+            # discover() start/stop per tick; falls back to aggressive_scan()
+            if self.bleak_available:
+                scanner = await self._start_persistent_scanner()
+            
             while self.continuous_scanning:
                 scan_count += 1
-                print(f"\n[*] Wardrive scan #{scan_count} at {datetime.now().strftime('%H:%M:%S')}")
+                print(f"\n[*] Wardrive scan #{scan_count} at {self._now().strftime('%H:%M:%S')}")
                 
                 # Get current location if callback provided
                 current_location = None
@@ -345,22 +729,29 @@ class HardwareScanner:
                         print(f"[!] Location error: {e}")
                 
                 # Perform scan
-                devices = await self.aggressive_scan(duration=scan_interval-2)
+                if scanner is not None:
+                    await asyncio.sleep(scan_interval)
+                    async with self._scan_lock:
+                        devices = self._classify_adv(self._drain_adv_buffer())
+                        await self._flush_log_async()
+                else:
+                    devices = await self.aggressive_scan(duration=scan_interval-2)
                 
                 # Enhance devices with location data
                 for device in devices:
-                    device["location"] = current_location
+                    device.location = current_location
                     if current_location:
-                        device["gps_coords"] = current_location
+                        device.gps_coords = current_location
                 
                 if devices:
                     print(f"[!] {len(devices)} skimmer(s) detected this scan")
                     
                     # Save batch to database
-                    self._save_wardrive_batch(devices, scan_count)
+                    await asyncio.to_thread(self._save_wardrive_batch, devices, scan_count)
                 
                 # Brief pause before next scan
-                await asyncio.sleep(2)
+                if scanner is None:
+                    await asyncio.sleep(2)
                 
         except KeyboardInterrupt:
             print("\n[+] Wardriving stopped by user")
@@ -368,83 +759,110 @@ class HardwareScanner:
             print(f"[!] Wardriving error: {e}")
         finally:
             self.continuous_scanning = False
+            self._seen_ttl = SEEN_RECENT_TTL
+            if scanner is not None:
+                try:
+                    await scanner.stop()
+                except Exception as e:
+                    print(f"[!] Could not stop scanner: {e}")
+            self._flush_log()
             self._generate_wardrive_report(scan_count)
     
+    async def _start_persistent_scanner(self):
+        """Start a callback-driven BleakScanner; None if it can't be started"""
+        if not await self.check_adapter():
+            print("[!] Adapter check failed, attempting recovery...")
+            await self.start_bluetooth_service()
+            await asyncio.sleep(3)
+        
+        self._adv_buffer = {}
+        scanner = self.BleakScanner(detection_callback=self._on_adv, adapter=self.adapter)
+        try:
+            await scanner.start()
+        except Exception as e:
+            print(f"[!] Persistent scan failed to start, using per-scan discovery: {e}")
+            self._invalidate_readiness()
+            return None
+        print(f"[*] Persistent Bleak scanner running on {self.adapter}")
+        return scanner
+    
     def _save_wardrive_batch(self, devices, scan_batch_id):
         """Save wardriving batch to database"""
         try:
-            import json
-            from datetime import datetime
-            
+            now = self._now()
             batch_data = {
-                "batch_id": f"WARDRIBE_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{scan_batch_id}",
-                "timestamp": datetime.now().isoformat(),
+                "batch_id": f"WARDRIBE_{now.strftime('%Y%m%d_%H%M%S')}_{scan_batch_id}",
+                "timestamp": now.isoformat(),
                 "device_count": len(devices),
                 "devices": devices
             }
             
             # Save to logs directory
-            with open(f"logs/wardrive_batch_{scan_batch_id}.json", "w") as f:
-                json.dump(batch_data, f, indent=2)
+            batch_path = self._log_dir / f"wardrive_batch_{scan_batch_id}.json"
+            batch_path.write_bytes(_json_bytes(batch_data))
             
             print(f"[+] Wardrive batch {scan_batch_id} saved")
             
-        except Exception as e:
+        except OSError as e:
             print(f"[!] Failed to save wardrive batch: {e}")
     
     def _generate_wardrive_report(self, total_scans):
         """Generate wardriving summary report"""
         try:
-            from datetime import datetime
+            now = self._now()
+            with self._hist_lock:
+                total_detections = len(self.detection_history)
+                unique_devices = len(self.hotspot_history)
+                # Top hotspots are tracked incrementally in _add_to_history
+                sorted_hotspots = [
+                    (addr, self.hotspot_history[addr])
+                    for _, addr in sorted(self._topk, reverse=True)
+                ]
             
             report = {
-                "report_id": f"WARDRIBE_REPORT_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                "generated": datetime.now().isoformat(),
+                "report_id": f"WARDRIBE_REPORT_{now.strftime('%Y%m%d_%H%M%S')}",
+                "generated": now.isoformat(),
                 "total_scans": total_scans,
-                "total_detections": len(self.detection_history),
-                "unique_devices": len(self.hotspot_history),
+                "total_detections": total_detections,
+                "unique_devices": unique_devices,
                 "hotspots": []
             }
             
-            # Identify top hotspots
-            sorted_hotspots = sorted(
-                self.hotspot_history.items(),
-                key=lambda x: x[1]["count"],
-                reverse=True
-            )[:10]  # Top 10
-            
             for addr, data in sorted_hotspots:
                 report["hotspots"].append({
                     "address": addr,
-                    "detection_count": data["count"],
-                    "max_threat": data["max_threat"],
-                    "first_seen": data["first_seen"],
-                    "last_seen": data["last_seen"]
+                    "detection_count": data.count,
+                    "max_threat": data.max_threat,
+                    "first_seen": data.first_seen,
+                    "last_seen": data.last_seen
                 })
             
             # Save report
-            report_file = f"exports/wardrive_report_{datetime.now().strftime('%Y%m%d')}.json"
-            with open(report_file, "w") as f:
-                json.dump(report, f, indent=2)
+            report_file = self._export_dir / f"wardrive_report_{now.strftime('%Y%m%d')}.json"
+            report_file.write_bytes(_json_bytes(report))
             
             print(f"\n[+] Wardrive report generated: {report_file}")
             print(f"    Total scans: {total_scans}")
-            print(f"    Total detections: {len(self.detection_history)}")
-            print(f"    Unique skimmers: {len(self.hotspot_history)}")
+            print(f"    Total detections: {total_detections}")
+            print(f"    Unique skimmers: {unique_devices}")
             
             if sorted_hotspots:
                 print("\n[+] TOP SKIMMER HOTSPOTS:")
                 for i, (addr, data) in enumerate(sorted_hotspots[:5], 1):
-                    print(f"    {i}. {addr[:17]}... - {data['count']} hits (Threat: {data['max_threat']}/10)")
+                    print(f"    {i}. {addr[:17]}... - {data.count} hits (Threat: {data.max_threat}/10)")
             
-        except Exception as e:
+        except OSError as e:
             print(f"[!] Failed to generate wardrive report: {e}")
     
     def get_wardrive_stats(self):
         """Get current wardriving statistics"""
-        return {
-            "continuous_scanning": self.continuous_scanning,
-            "total_detections": len(self.detection_history),
-            "unique_devices": len(self.hotspot_history),
-            "recent_detections": list(self.detection_history)[-10:] if self.detection_history else []
-        }
+        with self._hist_lock:
+            total = len(self.detection_history)
+            return {
+                "continuous_scanning": self.continuous_scanning,
+                "total_detections": total,
+                "unique_devices": len(self.hotspot_history),
+                "readiness_cache": {"hits": self.cache_hits, "misses": self.cache_misses},
+                # Only the tail is copied, not the whole 1000-entry deque
+                "recent_detections": list(islice(self.detection_history, max(0, total - 10), None))
+            }
@@ -0,0 +1,16 @@
+from datetime import datetime, timedelta
+
+# Detection indexes shared by Sentinel.setup_database and ThreatMapper
+DETECTION_INDEXES = '''
+    CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections(timestamp DESC);
+    CREATE INDEX IF NOT EXISTS idx_detections_station_ts
+        ON detections(station_name, station_address, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_detections_threat ON detections(threat_level);
+'''
+
+
+def lookback_cutoff(days, now=None):
+    """ISO date string for the start of a `days`-long lookback window (whole first day included)"""
+    # ISO timestamps compare lexicographically, so "timestamp >= cutoff"
+    # keeps the timestamp indexes usable (date() around the column would not)
+    return ((now or datetime.now()) - timedelta(days=days)).date().isoformat()
@@ -6,24 +6,26 @@ hardware-focused skimmer detection
 
 import sys
 import json
+import threading
+import time
 import sqlite3
 from datetime import datetime
 import asyncio
+from dataclasses import asdict
 from core.scanner import HardwareScanner
 from core.evidence import EvidenceCollector
 from core.reporter import LawEnforcementReport
+from core.schema import DETECTION_INDEXES, lookback_cutoff
 
-# Try to import mapper, but handle missing folium gracefully
-try:
-    from core.mapper import ThreatMapper
-    MAPPER_AVAILABLE = True
-except ImportError as e:
-    if "folium" in str(e):
-        print("[!] Folium library not installed. Map features will be limited.")
-        print("[*] Install it with: pip3 install folium pandas numpy")
-        MAPPER_AVAILABLE = False
-    else:
-        raise
+# Seconds a gpsd fix is reused before asking the daemon again
+GPS_CACHE_TTL = 1.0
+
+# (CSS class, badge color) for low / medium / high threat stations
+_THREAT_STYLES = (
+    ("low-threat", "#27ae60"),
+    ("medium-threat", "#f39c12"),
+    ("high-threat", "#e74c3c"),
+)
 
 class Sentinel:
     def __init__(self):
@@ -31,15 +33,20 @@ class Sentinel:
         self.evidence = EvidenceCollector()
         self.reporter = LawEnforcementReport()
         self.current_mission = None
+        self._gpsd = None
+        self._last_gps = None  # (monotonic time, (lat, lon)) of the last gpsd fix
+        self._input_thread = None
+        
+        # The mapper pulls in folium/pandas/numpy, so it is only loaded the
+        # first time a map is requested (False once one of them is known missing)
+        self._mapper = None
         
-        # Initialize mapper only if available
-        if MAPPER_AVAILABLE:
-            self.mapper = ThreatMapper()
-        else:
-            self.mapper = None
+        # One event loop for every scan, instead of a new loop per call
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
         
         # Verify hardware
-        if not self.scanner.check_adapter():
+        if not self._run(self.scanner.check_adapter()):
             print("[!] Bluetooth adapter not found!")
             print("[*] Check: hciconfig -a")
             sys.exit(1)
@@ -48,9 +55,22 @@ class Sentinel:
     
     def setup_database(self):
         """Evidence database"""
-        self.conn = sqlite3.connect('data/detections.db', check_same_thread=False)
+        # Autocommit mode: batch writers open their own BEGIN/COMMIT
+        self.conn = sqlite3.connect('data/detections.db', check_same_thread=False,
+                                    isolation_level=None)
         self.cursor = self.conn.cursor()
         
+        # WAL: a commit is one append instead of two fsyncs, and the mapper
+        # can read while scans are being written
+        self.cursor.executescript('''
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-65536;
+            PRAGMA mmap_size=268435456;
+            PRAGMA busy_timeout=5000;
+        ''')
+        
         self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS detections (
                 id TEXT PRIMARY KEY,
@@ -78,7 +98,56 @@ class Sentinel:
             )
         ''')
         
+        # Indexes for the evidence listing, station rollups and threat counts
+        self.cursor.executescript(DETECTION_INDEXES)
+        
         self.conn.commit()
+        
+        # Statement text is reused so sqlite3's statement cache keeps it compiled
+        self._det_sql = "INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    
+    def _run(self, coro):
+        """Run coro on the shared loop; Ctrl+C cancels it (so its cleanup runs) and re-raises"""
+        task = self._loop.create_task(coro)
+        try:
+            return self._loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            # Don't leave a half-run task on the loop to resume during the next scan
+            if not task.done():
+                task.cancel()
+                try:
+                    self._loop.run_until_complete(task)
+                except (asyncio.CancelledError, Exception):
+                    pass
+            raise
+    
+    async def _ainput(self, prompt):
+        """input() on a daemon thread, so the event loop keeps running while waiting"""
+        loop = asyncio.get_running_loop()
+        answer = loop.create_future()
+        
+        def deliver(setter, value):
+            if not answer.done():
+                setter(value)
+        
+        def read():
+            try:
+                line = input(prompt)
+            except Exception as e:
+                loop.call_soon_threadsafe(deliver, answer.set_exception, e)
+            else:
+                loop.call_soon_threadsafe(deliver, answer.set_result, line)
+        
+        self._input_thread = threading.Thread(target=read, daemon=True)
+        self._input_thread.start()
+        return await answer
+    
+    def shutdown(self):
+        """Close the event loop and the evidence database"""
+        if not self._loop.is_closed():
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+        self.conn.close()
     
     def mission_control(self):
         """Main interactive menu"""
@@ -114,6 +183,7 @@ class Sentinel:
                 self.deploy_countermeasures()
             elif choice == "8":
                 print("\n[+] Mission logged. Stay vigilant.\n")
+                self.shutdown()
                 sys.exit(0)
             else:
                 print("[!] Invalid selection")
@@ -131,40 +201,38 @@ class Sentinel:
         
         try:
             # Async scan
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            devices = loop.run_until_complete(
-                self.scanner.aggressive_scan(duration=15)
-            )
+            devices = self._run(self.scanner.aggressive_scan(duration=15))
             
             if devices:
                 print(f"\n[!] THREAT DETECTED: {len(devices)} suspicious device(s)")
                 for i, dev in enumerate(devices, 1):
-                    print(f"    {i}. {dev['name']} (RSSI: {dev['rssi']}) - Threat: {dev['threat_level']}/10")
+                    print(f"    {i}. {dev.name} (RSSI: {dev.rssi}) - Threat: {dev.threat_level}/10")
+                
+                max_threat = max((d.threat_level for d in devices), default=0)
+                devices_json = json.dumps([asdict(d) for d in devices])
                 
                 # Save to database
-                detection_id = f"DET-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                self.cursor.execute('''
-                    INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    detection_id,
-                    datetime.now().isoformat(),
-                    station_name,
-                    address,
-                    "GPS_COORDS_HERE",  # Add GPS module if available
-                    "UNKNOWN",
-                    max(d.get('threat_level', 0) for d in devices),
-                    json.dumps(devices),
-                    "{}",
-                    "Recon scan detection",
-                    "Sentinel_Operator"
-                ))
-                self.conn.commit()
+                now = datetime.now()
+                detection_id = f"DET-{now:%Y%m%d%H%M%S}"
+                with self.conn:
+                    self.cursor.execute(self._det_sql, (
+                        detection_id,
+                        now.isoformat(),
+                        station_name,
+                        address,
+                        "GPS_COORDS_HERE",  # Add GPS module if available
+                        "UNKNOWN",
+                        max_threat,
+                        devices_json,
+                        "{}",
+                        "Recon scan detection",
+                        "Sentinel_Operator"
+                    ))
                 
                 print(f"[+] Evidence logged: {detection_id}")
                 
                 # Immediate action recommendation
-                self._recommend_action(devices, station_name)
+                self._recommend_action(devices, station_name, max_threat)
             else:
                 print("[+] No immediate threats detected")
                 
@@ -194,7 +262,9 @@ class Sentinel:
                 # Try to import GPS module
                 import gpsd
                 gpsd.connect()
-                location_callback = lambda: (gpsd.get_current().lat, gpsd.get_current().lon)
+                self._gpsd = gpsd
+                self._last_gps = None
+                location_callback = self._current_gps
                 print("[+] GPS connected")
             except ImportError:
                 print("[!] Install gpsd for GPS tracking: sudo apt install gpsd gpsd-clients")
@@ -207,9 +277,7 @@ class Sentinel:
         
         try:
             # Run continuous wardriving
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(
+            self._run(
                 self.scanner.continuous_wardrive(
                     scan_interval=interval,
                     location_callback=location_callback
@@ -221,10 +289,18 @@ class Sentinel:
         except Exception as e:
             print(f"[!] Wardriving error: {e}")
     
-    def _recommend_action(self, devices, station_name):
+    def _current_gps(self):
+        """(lat, lon) from gpsd with one query per fix; readings under GPS_CACHE_TTL old are reused"""
+        now = time.monotonic()
+        if self._last_gps is not None and now - self._last_gps[0] < GPS_CACHE_TTL:
+            return self._last_gps[1]
+        fix = self._gpsd.get_current()
+        coords = (fix.lat, fix.lon)
+        self._last_gps = (now, coords)
+        return coords
+    
+    def _recommend_action(self, devices, station_name, max_threat):
         """Immediate response protocol"""
-        max_threat = max(d.get('threat_level', 0) for d in devices)
-        
         if max_threat >= 8:
             print("\n[!] IMMEDIATE ACTION REQUIRED:")
             print("    1. NOTIFY station management")
@@ -251,36 +327,55 @@ class Sentinel:
             print("[*] No stations loaded. Creating new patrol route...")
             stations = self._create_patrol_route()
         
+        try:
+            self._run(self._patrol(stations))
+        except KeyboardInterrupt:
+            print("\n[*] Patrol interrupted")
+            if self._input_thread is not None and self._input_thread.is_alive():
+                # The prompt's reader thread would otherwise eat the next menu choice
+                print("[*] Press Enter to return to the menu")
+                self._input_thread.join()
+        
+        print("\n[+] Patrol complete. Review evidence in database.")
+    
+    async def _patrol(self, stations):
+        """Scan each station in turn, warming the adapter up while the operator gets into position"""
+        total = len(stations)
         for i, station in enumerate(stations, 1):
-            print(f"\n[{i}/{len(stations)}] Target: {station['name']}")
-            print(f"    Address: {station['address']}")
+            print(f"\n[{i}/{total}] Target: {station['name']}\n"
+                  f"    Address: {station['address']}")
             
-            input("[*] Press Enter when in position (or 's' to skip)... ")
-            
-            # Scan this location
+            # Readiness is kept fresh for as long as the operator takes to get in position
+            in_position = asyncio.Event()
+            prewarm = asyncio.create_task(self.scanner.prewarm(until=in_position))
             try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                devices = loop.run_until_complete(
-                    self.scanner.aggressive_scan(duration=20)
-                )
+                await self._ainput("[*] Press Enter when in position (or 's' to skip)... ")
+                in_position.set()
                 
-                if devices:
-                    print(f"[!] {len(devices)} threat(s) detected!")
-                    # Collect visual evidence
-                    evidence = self.evidence.collect_visual(station)
-                    # Save to database
-                    self._save_patrol_finding(station, devices, evidence)
-                else:
-                    print("[+] Clean scan")
+                # Scan this location
+                try:
+                    await prewarm
+                    devices = await self.scanner.aggressive_scan(duration=20)
                     
-            except KeyboardInterrupt:
-                print("[*] Patrol interrupted")
-                break
-            except Exception as e:
-                print(f"[!] Error: {e}")
-        
-        print("\n[+] Patrol complete. Review evidence in database.")
+                    if devices:
+                        print(f"[!] {len(devices)} threat(s) detected!")
+                        # Collect visual evidence
+                        evidence = self.evidence.collect_visual(station)
+                        # Save to database
+                        self._save_patrol_finding(station, devices, evidence)
+                    else:
+                        print("[+] Clean scan")
+                        
+                except Exception as e:
+                    print(f"[!] Error: {e}")
+            finally:
+                # Interrupted at the prompt: don't leave prewarm pending on the shared loop
+                if not prewarm.done():
+                    prewarm.cancel()
+                    try:
+                        await prewarm
+                    except asyncio.CancelledError:
+                        pass
     
     def _load_town_stations(self):
         """Load known gas stations in your town"""
@@ -319,40 +414,48 @@ class Sentinel:
     
     def _save_patrol_finding(self, station, devices, evidence):
         """Save patrol findings with full evidence chain"""
-        detection_id = f"PATROL-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        now = datetime.now()
+        detection_id = f"PATROL-{now:%Y%m%d%H%M%S}"
         
-        self.cursor.execute('''
-            INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            detection_id,
-            datetime.now().isoformat(),
-            station['name'],
-            station['address'],
-            "GPS_PENDING",
-            "ALL_PUMPS",
-            max(d.get('threat_level', 0) for d in devices),
-            json.dumps(devices),
-            json.dumps(evidence),
-            f"Patrol finding at {station['name']}",
-            "Sentinel_Patrol"
-        ))
-        
-        # Update station risk score
-        self.cursor.execute('''
-            INSERT OR REPLACE INTO stations (id, name, address, last_checked, total_detections, risk_score)
-            VALUES (?, ?, ?, ?, COALESCE((SELECT total_detections FROM stations WHERE id = ?), 0) + 1, 
-                    COALESCE((SELECT risk_score FROM stations WHERE id = ?), 0) + ?)
-        ''', (
-            station['name'],
-            station['name'],
-            station['address'],
-            datetime.now().isoformat(),
-            station['name'],
-            station['name'],
-            len(devices) * 2
-        ))
+        # Detection row and station totals commit together, or not at all
+        try:
+            with self.conn:
+                self.cursor.execute("BEGIN")
+                self.cursor.execute(self._det_sql, (
+                    detection_id,
+                    now.isoformat(),
+                    station['name'],
+                    station['address'],
+                    "GPS_PENDING",
+                    "ALL_PUMPS",
+                    max(d.threat_level for d in devices),
+                    json.dumps([asdict(d) for d in devices]),
+                    json.dumps(evidence),
+                    f"Patrol finding at {station['name']}",
+                    "Sentinel_Patrol"
+                ))
+        
+                # Update station risk score (one primary-key upsert, SQLite 3.24+)
+                self.cursor.execute('''
+                    INSERT INTO stations (id, name, address, last_checked, total_detections, risk_score)
+                    VALUES (?, ?, ?, ?, 1, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        name = excluded.name,
+                        address = excluded.address,
+                        last_checked = excluded.last_checked,
+                        total_detections = COALESCE(total_detections, 0) + 1,
+                        risk_score = COALESCE(risk_score, 0) + excluded.risk_score
+                ''', (
+                    station['name'],
+                    station['name'],
+                    station['address'],
+                    now.isoformat(),
+                    len(devices) * 2
+                ))
+        except sqlite3.Error as e:
+            print(f"[!] Could not save {detection_id}: {e}")
+            return
         
-        self.conn.commit()
         print(f"[+] Evidence saved: {detection_id}")
     
     def view_evidence(self):
@@ -361,11 +464,16 @@ class Sentinel:
         print("EVIDENCE DATABASE")
         print("="*70)
         
+        # Latest 20 rows joined to the table-wide totals: one statement, and
+        # each side keeps its own index (idx_detections_ts / idx_detections_threat)
         self.cursor.execute('''
-            SELECT id, timestamp, station_name, threat_level, notes 
-            FROM detections 
-            ORDER BY timestamp DESC 
-            LIMIT 20
+            SELECT l.*, t.total, t.avg_threat
+            FROM (SELECT id, timestamp, station_name, threat_level, notes 
+                  FROM detections 
+                  ORDER BY timestamp DESC 
+                  LIMIT 20) l
+            CROSS JOIN (SELECT COUNT(*) AS total, AVG(threat_level) AS avg_threat
+                        FROM detections) t
         ''')
         
         findings = self.cursor.fetchall()
@@ -374,7 +482,7 @@ class Sentinel:
             print("[*] No evidence collected yet")
             return
         
-        for fid, timestamp, station, threat, notes in findings:
+        for fid, timestamp, station, threat, notes, _, _ in findings:
             print(f"\nID: {fid}")
             print(f"  Station: {station}")
             print(f"  Time: {timestamp[:19]}")
@@ -382,8 +490,7 @@ class Sentinel:
             print(f"  Notes: {notes[:60]}...")
         
         # Statistics
-        self.cursor.execute('SELECT COUNT(*), AVG(threat_level) FROM detections')
-        count, avg_threat = self.cursor.fetchone()
+        count, avg_threat = findings[0][5:]
         print(f"\n[*] Total detections: {count}")
         print(f"[*] Average threat level: {avg_threat:.1f}/10")
     
@@ -393,7 +500,8 @@ class Sentinel:
         print("GENERATING THREAT MAP")
         print("="*70)
         
-        if not MAPPER_AVAILABLE or self.mapper is None:
+        mapper = self._get_mapper()
+        if not mapper:
             print("[!] Advanced mapping features require folium")
             print("[*] Install dependencies: pip3 install folium pandas numpy")
             print("[*] For now, using basic text-based map...")
@@ -402,7 +510,7 @@ class Sentinel:
         
         # Use the new mapper if available
         try:
-            map_file = self.mapper.generate_map()
+            map_file = mapper.generate_map()
             
             if map_file and map_file != "No data available for mapping":
                 print(f"\n[✓] Interactive map generated successfully!")
@@ -419,6 +527,19 @@ class Sentinel:
             print("[*] Using fallback method...")
             self._generate_text_map()
     
+    def _get_mapper(self):
+        """Import and create the ThreatMapper on first use"""
+        if self._mapper is None:
+            try:
+                from core.mapper import ThreatMapper
+            except ImportError as e:
+                # folium, pandas or numpy missing - callers fall back to the text map
+                print(f"[!] Mapping libraries not available ({e.name or e}). Map features will be limited.")
+                self._mapper = False
+            else:
+                self._mapper = ThreatMapper()
+        return self._mapper
+    
     def _generate_text_map(self):
         """Generate simple text-based threat map"""
         print("\n[*] Generating text-based threat map...")
@@ -426,8 +547,13 @@ class Sentinel:
         self.cursor.execute('''
             SELECT station_name, station_address, COUNT(*) as hits, 
                    AVG(threat_level) as avg_threat,
-                   GROUP_CONCAT(DISTINCT substr(timestamp, 1, 10)) as dates
-            FROM detections 
+                   (SELECT GROUP_CONCAT(day) FROM (
+                        SELECT DISTINCT substr(d2.timestamp, 1, 10) AS day
+                        FROM detections d2
+                        WHERE d2.station_name IS det.station_name
+                          AND d2.station_address IS det.station_address
+                        ORDER BY day DESC LIMIT 5)) as dates
+            FROM detections det
             GROUP BY station_name, station_address
             ORDER BY hits DESC
         ''')
@@ -454,7 +580,7 @@ class Sentinel:
             print(f"   📍 Address: {address}")
             print(f"   ⚠️  Threat Level: {threat:.1f}/10 {threat_stars}")
             print(f"   📊 Detections: {hits}")
-            print(f"   📅 Dates: {dates[:80]}...")
+            print(f"   📅 Dates: {(dates or '')[:80]}...")
         
         # Summary statistics
         print("\n" + "="*70)
@@ -475,8 +601,9 @@ class Sentinel:
     
     def _create_basic_html_map(self, stations):
         """Create a very basic HTML map without external dependencies"""
+        now = datetime.now()
         try:
-            html_content = f'''<!DOCTYPE html>
+            parts = [f'''<!DOCTYPE html>
 <html>
 <head>
     <title>Skimmer Sentinel - Threat Map</title>
@@ -500,7 +627,7 @@ class Sentinel:
 <body>
     <div class="header">
         <h1>🛡️ Skimmer Sentinel - Threat Map</h1>
-        <p>Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')} | Total Stations: {len(stations)}</p>
+        <p>Generated: {now:%Y-%m-%d %H:%M} | Total Stations: {len(stations)}</p>
     </div>
     
     <div class="legend">
@@ -509,32 +636,24 @@ class Sentinel:
            <span class="threat-badge" style="background:#f39c12;">Medium (4-6)</span>
            <span class="threat-badge" style="background:#e74c3c;">High (7-10)</span></p>
     </div>
-'''
+''']
             
             for i, (name, address, hits, threat, dates) in enumerate(stations, 1):
                 threat_level = int(threat) if threat else 0
-                if threat_level >= 7:
-                    threat_class = "high-threat"
-                    threat_color = "#e74c3c"
-                elif threat_level >= 4:
-                    threat_class = "medium-threat"
-                    threat_color = "#f39c12"
-                else:
-                    threat_class = "low-threat"
-                    threat_color = "#27ae60"
+                threat_class, threat_color = _THREAT_STYLES[(threat_level >= 7) + (threat_level >= 4)]
                 
-                html_content += f'''
+                parts.append(f'''
     <div class="station {threat_class}">
         <h3>#{i} {name}</h3>
         <p><strong>📍 Address:</strong> {address}</p>
         <p><strong>⚠️ Threat Level:</strong> 
             <span class="threat-badge" style="background:{threat_color};">{threat:.1f}/10</span>
             Detections: {hits}</p>
-        <p><strong>📅 Dates:</strong> {dates[:100]}...</p>
+        <p><strong>📅 Dates:</strong> {(dates or "")[:100]}...</p>
     </div>
-'''
+''')
             
-            html_content += '''
+            parts.append('''
     <div style="margin-top: 30px; padding: 15px; background: #f8f9fa; border-radius: 5px;">
         <h3>⚠️ Important Notice</h3>
         <p>This is a basic threat visualization. For interactive maps with GPS coordinates, 
@@ -543,14 +662,15 @@ class Sentinel:
         <p>Then run the MAP option in Skimmer Sentinel again.</p>
     </div>
 </body>
-</html>'''
+</html>''')
+            html_content = ''.join(parts)
             
             # Save the HTML file
             import os
             if not os.path.exists('exports'):
                 os.makedirs('exports')
             
-            map_file = f"exports/threat_map_{datetime.now().strftime('%Y%m%d_%H%M')}.html"
+            map_file = f"exports/threat_map_{now:%Y%m%d_%H%M}.html"
             with open(map_file, 'w') as f:
                 f.write(html_content)
             
@@ -569,18 +689,26 @@ class Sentinel:
         # Get date range
         days = input("[?] Report for how many days back? (default 30): ").strip()
         days = int(days) if days.isdigit() else 30
+        now = datetime.now()
+        cutoff = lookback_cutoff(days, now)
         
         # Query database
         self.cursor.execute('''
             SELECT station_name, station_address, COUNT(*) as incidents,
                    MAX(threat_level) as max_threat, 
-                   GROUP_CONCAT(DISTINCT substr(timestamp, 1, 10)) as dates
-            FROM detections 
-            WHERE date(timestamp) >= date('now', ?)
+                   (SELECT GROUP_CONCAT(day) FROM (
+                        SELECT DISTINCT substr(d2.timestamp, 1, 10) AS day
+                        FROM detections d2
+                        WHERE d2.station_name IS det.station_name
+                          AND d2.station_address IS det.station_address
+                          AND d2.timestamp >= :since
+                        ORDER BY day DESC LIMIT 5)) as dates
+            FROM detections det
+            WHERE timestamp >= :since
             GROUP BY station_name, station_address
             HAVING COUNT(*) > 0
             ORDER BY incidents DESC
-        ''', (f'-{days} days',))
+        ''', {"since": cutoff})
         
         results = self.cursor.fetchall()
         
@@ -589,33 +717,40 @@ class Sentinel:
             return
         
         # Generate report
-        report_id = f"LE-REPORT-{datetime.now().strftime('%Y%m%d')}"
+        report_id = f"LE-REPORT-{now:%Y%m%d}"
         report_file = f"exports/{report_id}.txt"
         
-        with open(report_file, 'w') as f:
+        # Totals for the summary in one pass over the rows
+        total_incidents = 0
+        max_threat = 0
+        for r in results:
+            total_incidents += r[2]
+            if r[3] > max_threat:
+                max_threat = r[3]
+        
+        with open(report_file, 'w', buffering=1 << 16) as f:
             f.write("="*80 + "\n")
             f.write("OFFICIAL SKIMMER DETECTION REPORT\n")
             f.write("="*80 + "\n\n")
             f.write(f"Report ID: {report_id}\n")
-            f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"Generated: {now:%Y-%m-%d %H:%M:%S}\n")
             f.write(f"Time Period: Last {days} days\n\n")
             
             f.write("EXECUTIVE SUMMARY\n")
             f.write("-"*40 + "\n")
             f.write(f"Total Stations Affected: {len(results)}\n")
-            total_incidents = sum(r[2] for r in results)
             f.write(f"Total Incidents: {total_incidents}\n")
-            f.write(f"Highest Threat Level: {max(r[3] for r in results)}/10\n\n")
+            f.write(f"Highest Threat Level: {max_threat}/10\n\n")
             
             f.write("AFFECTED STATIONS (Priority Order)\n")
             f.write("-"*40 + "\n")
             
             for i, (name, addr, incidents, threat, dates) in enumerate(results, 1):
-                f.write(f"\n{i}. {name}\n")
-                f.write(f"   Address: {addr}\n")
-                f.write(f"   Incidents: {incidents}\n")
-                f.write(f"   Max Threat: {threat}/10\n")
-                f.write(f"   Dates: {dates[:100]}...\n")
+                f.write(f"\n{i}. {name}\n"
+                        f"   Address: {addr}\n"
+                        f"   Incidents: {incidents}\n"
+                        f"   Max Threat: {threat}/10\n"
+                        f"   Dates: {(dates or '')[:100]}...\n")
             
             f.write("\n" + "="*80 + "\n")
             f.write("RECOMMENDED ACTIONS\n")
@@ -689,11 +824,6 @@ def main():
     print("[*] Loading modules...")
     print("[*] Database connected...")
     
-    if not MAPPER_AVAILABLE:
-        print("[!] WARNING: Advanced mapping requires folium")
-        print("[*] You can still use all other features")
-        print("[*] Install: pip3 install folium pandas numpy")
-    
     print("[+] READY FOR DEPLOYMENT\n")
     
     sentinel = Sentinel()